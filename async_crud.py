@@ -0,0 +1,367 @@
+"""Async versions of the CRUD classes in crud.py, used by the API routers"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, date
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from models import *
+from async_database import adb
+from cache import cache
+from coalesce import single_flight
+from ingest import add_write_listener
+from rollups import GRANULARITIES, add_rollup_listener
+from retention import TIERS
+
+class VisitorCRUD:
+    @staticmethod
+    async def get_all(limit: int = 100, after: Optional[Tuple[datetime, int]] = None) -> List[Dict]:
+        """Newest first; pass the (timestamp, id) of the last row seen to get the next page"""
+        async with adb.get_cursor() as cur:
+            if after is None:
+                await cur.execute("""
+                    SELECT * FROM visitors 
+                    ORDER BY timestamp DESC, id DESC 
+                    LIMIT %s
+                """, (limit,))
+            else:
+                await cur.execute("""
+                    SELECT * FROM visitors 
+                    WHERE (timestamp, id) < (%s, %s)
+                    ORDER BY timestamp DESC, id DESC 
+                    LIMIT %s
+                """, (*after, limit))
+            return await cur.fetchall()
+    
+    @staticmethod
+    async def get_by_id(visitor_id: int) -> Optional[Dict]:
+        async with adb.get_cursor() as cur:
+            await cur.execute("SELECT * FROM visitors WHERE id = %s", (visitor_id,))
+            return await cur.fetchone()
+    
+    @staticmethod
+    @cache.cached("visitors.current", ttl=5, stale_ttl=30)
+    async def get_current_count() -> int:
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                SELECT SUM(count) as total 
+                FROM visitors 
+                WHERE timestamp > NOW() - INTERVAL '15 minutes'
+            """)
+            result = await cur.fetchone()
+            return result['total'] if result['total'] else 0
+    
+    @staticmethod
+    async def get_by_date_range(start: datetime, end: datetime) -> List[Dict]:
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                SELECT * FROM visitors 
+                WHERE timestamp BETWEEN %s AND %s 
+                ORDER BY timestamp
+            """, (start, end))
+            return await cur.fetchall()
+    
+    @staticmethod
+    async def stream_by_date_range(start: datetime, end: datetime, batch_size: int = 2000) -> AsyncIterator[List[Dict]]:
+        """Yield the range in batches from a server-side cursor"""
+        async with adb.get_connection() as conn:
+            async with conn.cursor(name="visitors_range") as cur:
+                await cur.execute("""
+                    SELECT * FROM visitors 
+                    WHERE timestamp BETWEEN %s AND %s 
+                    ORDER BY timestamp
+                """, (start, end))
+                while True:
+                    rows = await cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+    
+    @staticmethod
+    async def get_bucketed_range(start: datetime, end: datetime, granularity: str) -> List[Dict]:
+        """Per-section totals for each rollup bucket overlapping [start, end], oldest first"""
+        bucket = GRANULARITIES[granularity]
+        async with adb.get_cursor() as cur:
+            await cur.execute(f"""
+                SELECT bucket as timestamp, section, SUM(total_visitors)::bigint as count,
+                       SUM(records_count)::bigint as records_count
+                FROM (
+                    SELECT bucket, section, total_visitors, records_count
+                    FROM visitor_rollup_{granularity}
+                    WHERE bucket > %(start)s - make_interval(secs => %(width)s) AND bucket <= %(end)s
+                    UNION ALL
+                    SELECT {bucket}, section, count, 1
+                    FROM visitors
+                    WHERE ingest_xid >= (SELECT COALESCE(last_xid, '0'::xid8) FROM rollup_state WHERE source = 'visitors')
+                      AND timestamp BETWEEN %(start)s AND %(end)s
+                ) buckets
+                GROUP BY bucket, section
+                ORDER BY bucket, section
+            """, {'start': start, 'end': end, 'width': TIERS[granularity]})
+            return await cur.fetchall()
+    
+    @staticmethod
+    @single_flight.coalesced("visitors.sections")
+    async def get_section_traffic() -> List[Dict]:
+        """Last 24h per section from hourly/minute rollups plus raw rows not yet rolled up"""
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                WITH bounds AS (
+                    SELECT NOW() - INTERVAL '24 hours' AS since,
+                           date_trunc('hour', NOW() - INTERVAL '24 hours') + INTERVAL '1 hour' AS first_hour
+                ), traffic AS (
+                    SELECT section, total_visitors, records_count
+                    FROM visitor_rollup_hour, bounds
+                    WHERE bucket >= first_hour
+                    UNION ALL
+                    SELECT section, total_visitors, records_count
+                    FROM visitor_rollup_minute, bounds
+                    WHERE bucket >= since AND bucket < first_hour
+                    UNION ALL
+                    SELECT section, count, 1
+                    FROM visitors, bounds
+                    WHERE ingest_xid >= (SELECT COALESCE(last_xid, '0'::xid8) FROM rollup_state WHERE source = 'visitors')
+                      AND timestamp > since
+                )
+                SELECT section, SUM(total_visitors)::bigint as total_visitors,
+                       SUM(records_count)::bigint as records_count
+                FROM traffic 
+                GROUP BY section 
+                ORDER BY total_visitors DESC
+            """)
+            return await cur.fetchall()
+
+class CashierCRUD:
+    @staticmethod
+    @cache.cached("cashier.current", ttl=3, stale_ttl=15)
+    async def get_current_status() -> Optional[Dict]:
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                SELECT * FROM cashier 
+                ORDER BY timestamp DESC 
+                LIMIT 1
+            """)
+            return await cur.fetchone()
+    
+    @staticmethod
+    async def get_queue_history(hours: int = 6, limit: Optional[int] = None,
+                                after: Optional[Tuple[datetime, int]] = None) -> List[Dict]:
+        """Oldest first; pass the (timestamp, id) of the last row seen to get the next page"""
+        async with adb.get_cursor() as cur:
+            if after is None:
+                await cur.execute("""
+                    SELECT id, timestamp, queue_length, status, wait_time_minutes
+                    FROM cashier 
+                    WHERE timestamp > NOW() - make_interval(hours => %s)
+                    ORDER BY timestamp, id
+                    LIMIT %s
+                """, (hours, limit))
+            else:
+                await cur.execute("""
+                    SELECT id, timestamp, queue_length, status, wait_time_minutes
+                    FROM cashier 
+                    WHERE timestamp > NOW() - make_interval(hours => %s)
+                      AND (timestamp, id) > (%s, %s)
+                    ORDER BY timestamp, id
+                    LIMIT %s
+                """, (hours, *after, limit))
+            return await cur.fetchall()
+    
+    @staticmethod
+    async def get_bucketed_history(hours: int, granularity: str) -> List[Dict]:
+        """Queue statistics per rollup bucket over the last hours, oldest first"""
+        bucket = GRANULARITIES[granularity]
+        async with adb.get_cursor() as cur:
+            await cur.execute(f"""
+                SELECT bucket as timestamp,
+                       SUM(queue_sum)::float / SUM(records_count) as avg_queue,
+                       MAX(queue_max) as max_queue,
+                       SUM(wait_sum) / NULLIF(SUM(wait_count), 0) as avg_wait_minutes,
+                       SUM(records_count)::bigint as records_count
+                FROM (
+                    SELECT bucket, queue_sum, queue_max, wait_sum, wait_count, records_count
+                    FROM cashier_rollup_{granularity}
+                    WHERE bucket > NOW() - make_interval(hours => %(hours)s, secs => %(width)s)
+                    UNION ALL
+                    SELECT {bucket}, queue_length, queue_length, COALESCE(wait_time_minutes, 0),
+                           (wait_time_minutes IS NOT NULL)::int, 1
+                    FROM cashier
+                    WHERE ingest_xid >= (SELECT COALESCE(last_xid, '0'::xid8) FROM rollup_state WHERE source = 'cashier')
+                      AND timestamp > NOW() - make_interval(hours => %(hours)s)
+                ) buckets
+                GROUP BY bucket
+                ORDER BY bucket
+            """, {'hours': hours, 'width': TIERS[granularity]})
+            return await cur.fetchall()
+    
+    @staticmethod
+    async def get_busy_periods(threshold: int = 3) -> List[Dict]:
+        """Hours of the last 7 days whose average queue exceeded threshold, from hourly rollups"""
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                SELECT bucket as hour_start,
+                       queue_sum::float / records_count as avg_queue,
+                       queue_max as max_queue
+                FROM cashier_rollup_hour 
+                WHERE bucket > date_trunc('hour', NOW() - INTERVAL '7 days')
+                  AND queue_sum > %s * records_count
+                ORDER BY avg_queue DESC
+            """, (threshold,))
+            return await cur.fetchall()
+
+class HeatmapCRUD:
+    @staticmethod
+    @cache.cached("heatmap.latest", ttl=5, stale_ttl=30)
+    @single_flight.coalesced("heatmap.latest")
+    async def get_latest() -> List[Dict]:
+        async with adb.get_cursor() as cur:
+            # heatmap_latest holds one row per section, maintained by trigger
+            await cur.execute("""
+                SELECT id, timestamp, section, density_level, coordinates, visitor_count
+                FROM heatmap_latest
+                ORDER BY section
+            """)
+            return await cur.fetchall()
+
+    @staticmethod
+    @cache.cached("heatmap.density", ttl=5, stale_ttl=30)
+    async def get_by_density(level: str) -> List[Dict]:
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                SELECT id, timestamp, section, density_level, coordinates, visitor_count
+                FROM heatmap_latest
+                WHERE density_level = %s
+                ORDER BY section
+            """, (level,))
+            return await cur.fetchall()
+    
+    @staticmethod
+    async def get_density_analysis() -> Dict[str, Any]:
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                SELECT 
+                    COUNT(CASE WHEN density_level = 'high' THEN 1 END) as high_count,
+                    COUNT(CASE WHEN density_level = 'medium' THEN 1 END) as medium_count,
+                    COUNT(CASE WHEN density_level = 'low' THEN 1 END) as low_count,
+                    AVG(visitor_count) as avg_visitors
+                FROM heatmap 
+                WHERE timestamp > NOW() - INTERVAL '1 hour'
+            """)
+            return await cur.fetchone()
+
+class PredictionCRUD:
+    @staticmethod
+    @cache.cached("predictions.latest", ttl=60, stale_ttl=300)
+    @single_flight.coalesced("predictions.latest")
+    async def get_latest_forecasts() -> List[Dict]:
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                SELECT DISTINCT ON (metric_type, forecast_horizon) *
+                FROM predictions 
+                ORDER BY metric_type, forecast_horizon, prediction_timestamp DESC
+            """)
+            return await cur.fetchall()
+    
+    @staticmethod
+    async def get_metric_forecast(metric_type: str, horizon: str = "1h") -> Optional[Dict]:
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                SELECT * FROM predictions 
+                WHERE metric_type = %s AND forecast_horizon = %s
+                ORDER BY prediction_timestamp DESC 
+                LIMIT 1
+            """, (metric_type, horizon))
+            return await cur.fetchone()
+
+DAILY_SUMMARY_TTL = float(os.getenv('DAILY_SUMMARY_TTL', 30))
+# New data drops the memo at most this often; ingestion flushes about every 0.5s
+DAILY_SUMMARY_MIN_AGE = float(os.getenv('DAILY_SUMMARY_MIN_AGE', 5))
+_daily_invalidation = {'at': 0.0, 'scheduled': None}
+
+async def invalidate_daily_summary(*_):
+    """Drop cached summaries when new data lands; hooked to ingestion and rollup progress.
+
+    Rate limited to once per DAILY_SUMMARY_MIN_AGE seconds. A call inside that window
+    schedules one drop at its end, so the last batch is never left out for a full TTL.
+    """
+    scheduled = _daily_invalidation['scheduled']
+    if scheduled is not None and not scheduled.done():
+        return
+    wait = _daily_invalidation['at'] + DAILY_SUMMARY_MIN_AGE - time.monotonic()
+    if wait > 0:
+        _daily_invalidation['scheduled'] = asyncio.create_task(_invalidate_daily_summary_after(wait))
+        return
+    _daily_invalidation['at'] = time.monotonic()
+    await cache.invalidate("analytics.daily")
+
+async def _invalidate_daily_summary_after(delay: float):
+    await asyncio.sleep(delay)
+    _daily_invalidation['at'] = time.monotonic()
+    await cache.invalidate("analytics.daily")
+
+class AnalyticsCRUD:
+    @staticmethod
+    async def get_data_version() -> Dict[str, Any]:
+        """Newest inserting transaction of visitor and cashier rows; never cached, so callers can detect new data.
+
+        ingest_xid moves on every commit, even for late or backfilled rows whose client timestamps are old.
+        """
+        async with adb.get_cursor() as cur:
+            await cur.execute("""
+                SELECT (SELECT MAX(ingest_xid)::text::bigint FROM visitors) as visitors,
+                       (SELECT MAX(ingest_xid)::text::bigint FROM cashier) as cashier
+            """)
+            return await cur.fetchone()
+
+    @staticmethod
+    async def get_daily_summary() -> Dict[str, Any]:
+        # Keyed on the calendar day so a summary never outlives midnight
+        return dict(await AnalyticsCRUD._daily_summary(date.today()))
+
+    @staticmethod
+    @cache.cached("analytics.daily", ttl=DAILY_SUMMARY_TTL)
+    async def _daily_summary(today: date) -> Dict[str, Any]:
+        # Get today's date at midnight
+        today_start = datetime.combine(today, datetime.min.time())
+        async with adb.get_cursor() as cur:
+            # One pass over hourly rollups since midnight plus raw rows not yet rolled up
+            await cur.execute("""
+                WITH visitor_hours AS (
+                    SELECT bucket, section, total_visitors
+                    FROM visitor_rollup_hour
+                    WHERE bucket >= %(since)s
+                    UNION ALL
+                    SELECT date_trunc('hour', timestamp), section, count
+                    FROM visitors
+                    WHERE ingest_xid >= (SELECT COALESCE(last_xid, '0'::xid8) FROM rollup_state WHERE source = 'visitors')
+                      AND timestamp >= %(since)s
+                ), cashier_hours AS (
+                    SELECT queue_sum, records_count
+                    FROM cashier_rollup_hour
+                    WHERE bucket >= %(since)s
+                    UNION ALL
+                    SELECT queue_length, 1
+                    FROM cashier
+                    WHERE ingest_xid >= (SELECT COALESCE(last_xid, '0'::xid8) FROM rollup_state WHERE source = 'cashier')
+                      AND timestamp >= %(since)s
+                )
+                SELECT
+                    (SELECT SUM(total_visitors) FROM visitor_hours) as total_visitors,
+                    (SELECT section FROM visitor_hours
+                     GROUP BY section ORDER BY SUM(total_visitors) DESC LIMIT 1) as busiest_section,
+                    (SELECT EXTRACT(HOUR FROM bucket) FROM visitor_hours
+                     GROUP BY EXTRACT(HOUR FROM bucket) ORDER BY SUM(total_visitors) DESC LIMIT 1) as peak_hour,
+                    (SELECT SUM(queue_sum)::float / NULLIF(SUM(records_count), 0)
+                     FROM cashier_hours) as avg_queue
+            """, {'since': today_start})
+            result = await cur.fetchone()
+
+        return {
+            'total_visitors_today': result['total_visitors'] or 0,
+            'busiest_section': result['busiest_section'] or 'N/A',
+            'avg_queue_length': round(result['avg_queue'] or 0, 1),
+            'peak_hour': f"{int(result['peak_hour'])}:00" if result['peak_hour'] is not None else 'N/A',
+            'timestamp': datetime.now()
+        }
+
+add_write_listener(lambda table, rows: table in ('visitors', 'cashier') and invalidate_daily_summary())
+add_rollup_listener(invalidate_daily_summary)
@@ -0,0 +1,95 @@
+import os
+import time
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+load_dotenv()
+
+class AsyncDatabase:
+    """Async counterpart of database.Database backed by a psycopg 3 pool"""
+
+    def __init__(self, min_size=None, max_size=None, acquire_timeout=None, idle_check_after=None):
+        self.connection_string = os.getenv('DATABASE_URL')
+        self.sslmode = os.getenv('DB_SSLMODE', 'require')
+        self.min_size = min_size if min_size is not None else int(os.getenv('DB_POOL_MIN', 1))
+        self.max_size = max_size if max_size is not None else int(os.getenv('DB_POOL_MAX', 10))
+        self.acquire_timeout = acquire_timeout if acquire_timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 5))
+        self.idle_check_after = idle_check_after if idle_check_after is not None else float(os.getenv('DB_POOL_IDLE_CHECK', 30))
+        self._pool = None
+        self._last_used = {}
+
+    async def _check(self, conn):
+        """Ping connections that sat idle long enough to have been dropped server-side"""
+        idle_since = self._last_used.pop(id(conn), None)
+        if idle_since is not None and time.monotonic() - idle_since < self.idle_check_after:
+            return
+        await AsyncConnectionPool.check_connection(conn)
+
+    async def _reset(self, conn):
+        self._last_used[id(conn)] = time.monotonic()
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = AsyncConnectionPool(
+                self.connection_string,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                timeout=self.acquire_timeout,
+                kwargs={'row_factory': dict_row, 'sslmode': self.sslmode},
+                check=self._check,
+                reset=self._reset,
+                open=False,
+            )
+        return self._pool
+
+    async def open(self):
+        """Open the pool; call once the event loop is running"""
+        await self._get_pool().open()
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @asynccontextmanager
+    async def get_connection(self):
+        """Borrow a pooled async connection and return it on exit"""
+        pool = self._get_pool()
+        if pool.closed:
+            await pool.open()
+        try:
+            async with pool.connection() as conn:
+                yield conn
+        except (psycopg.OperationalError, PoolTimeout) as e:
+            print(f"Database connection failed: {e}")
+            raise
+
+    @asynccontextmanager
+    async def get_cursor(self):
+        """Get an async cursor; the transaction commits on success"""
+        async with self.get_connection() as conn:
+            async with conn.cursor() as cursor:
+                yield cursor
+
+    async def is_ready(self, timeout: float = 1.0) -> bool:
+        """True if the pool is open and can hand out a connection within timeout"""
+        if self._pool is None or self._pool.closed:
+            return False
+        try:
+            async with self._pool.connection(timeout=timeout):
+                return True
+        except (psycopg.OperationalError, PoolTimeout):
+            return False
+
+    def pool_stats(self):
+        if self._pool is None:
+            return {'min_size': self.min_size, 'max_size': self.max_size, 'open': 0}
+        stats = self._pool.get_stats()
+        stats.update({'min_size': self.min_size, 'max_size': self.max_size})
+        return stats
+
+# Global async database instance
+adb = AsyncDatabase()
@@ -0,0 +1,50 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+class PeriodicTask:
+    """Run an async callable every `interval` seconds until stopped"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval: float, initial_delay: float = 0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self._task = None
+        self._stats = {'runs': 0, 'failures': 0, 'last_run': None, 'last_duration_s': None, 'last_error': None}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name=self.name)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self):
+        started = time.perf_counter()
+        try:
+            return await self.func()
+        except Exception as e:
+            self._stats['failures'] += 1
+            self._stats['last_error'] = str(e)
+            print(f"Background task '{self.name}' failed: {e}")
+        finally:
+            self._stats['runs'] += 1
+            self._stats['last_run'] = time.time()
+            self._stats['last_duration_s'] = round(time.perf_counter() - started, 4)
+
+    async def _loop(self):
+        if self.initial_delay:
+            await asyncio.sleep(self.initial_delay)
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return dict(self._stats, interval_s=self.interval, running=self._task is not None)
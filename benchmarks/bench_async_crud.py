@@ -0,0 +1,86 @@
+"""Concurrent throughput of one event loop: blocking CRUD vs the async CRUD layer.
+
+Simulates a single uvicorn worker serving N concurrent requests whose query
+takes QUERY_SECONDS on the server (pg_sleep). With the old blocking calls the
+requests run one after another; with async_crud they overlap up to the pool size.
+
+    DATABASE_URL=... python benchmarks/bench_async_crud.py --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from async_database import AsyncDatabase
+
+
+async def blocking_handler(db, query_seconds):
+    # What every router did before: async def around a synchronous psycopg2 call
+    with db.get_cursor() as cur:
+        cur.execute("SELECT pg_sleep(%s), SUM(count) AS total FROM visitors", (query_seconds,))
+        return cur.fetchone()
+
+
+async def async_handler(adb, query_seconds):
+    async with adb.get_cursor() as cur:
+        await cur.execute("SELECT pg_sleep(%s), SUM(count) AS total FROM visitors", (query_seconds,))
+        return await cur.fetchone()
+
+
+async def run(handler, backend, requests, concurrency, query_seconds):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await handler(backend, query_seconds)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'req_per_s': round(requests / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--pool-size', type=int, default=20)
+    parser.add_argument('--query-seconds', type=float, default=0.02)
+    args = parser.parse_args()
+
+    db = Database(min_size=1, max_size=args.pool_size)
+    adb = AsyncDatabase(min_size=args.pool_size, max_size=args.pool_size)
+    await adb.open()
+    try:
+        # Warm both pools so connection setup is not measured
+        await blocking_handler(db, 0)
+        await asyncio.gather(*(async_handler(adb, 0) for _ in range(args.pool_size)))
+
+        blocking = await run(blocking_handler, db, args.requests, args.concurrency, args.query_seconds)
+        non_blocking = await run(async_handler, adb, args.requests, args.concurrency, args.query_seconds)
+    finally:
+        await adb.close()
+        db.close()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"pool {args.pool_size}, query {args.query_seconds * 1000:.0f} ms")
+    print(f"  blocking psycopg2: {blocking}")
+    print(f"  async psycopg 3:   {non_blocking}")
+    print(f"  speedup: {non_blocking['req_per_s'] / blocking['req_per_s']:.1f}x")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
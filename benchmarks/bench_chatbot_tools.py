@@ -0,0 +1,63 @@
+"""Chatbot tool latency: HTTP round trip to the API vs direct in-process CRUD calls.
+
+Direct mode goes through the same cached async CRUD layer the API uses, so the
+difference is the HTTP hop, JSON encode/decode and request routing.
+
+Needs the API running at BACKEND_API_URL (for HTTP mode) and DATABASE_URL
+(for direct mode):
+
+    uvicorn main:app --port 8000 &
+    DATABASE_URL=... python benchmarks/bench_chatbot_tools.py --calls 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chatbot_tools
+from chatbot_tools import DirectBackend, HttpBackend
+from async_database import adb
+
+TOOLS = (
+    chatbot_tools.get_current_visitors,
+    chatbot_tools.get_busiest_section,
+    chatbot_tools.get_cashier_queue,
+)
+
+
+def measure(tool, calls):
+    # One warm-up call so connection setup is not measured
+    tool()
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        tool()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    results = {}
+    for mode, backend in (("http", HttpBackend()), ("direct", DirectBackend())):
+        chatbot_tools.backend = backend
+        results[mode] = {tool.__name__: measure(tool, args.calls) for tool in TOOLS}
+    backend._run(adb.close())
+
+    print(f"{args.calls} calls per tool, latency in ms (mean / p50 / p95)")
+    for tool in TOOLS:
+        http, direct = results["http"][tool.__name__], results["direct"][tool.__name__]
+        print(f"  {tool.__name__:<22} http {http[0]:7.2f} / {http[1]:7.2f} / {http[2]:7.2f}"
+              f"   direct {direct[0]:7.2f} / {direct[1]:7.2f} / {direct[2]:7.2f}"
+              f"   ({http[0] / direct[0]:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Forecast fit time against history length and number of series.
+
+Fits synthetic hourly series (daily season plus noise) with forecasting.fit,
+which runs seasonal naive and Holt-Winters across all series at once. Also
+times fitting the same series one at a time, to show the gain from
+vectorizing across sections. No database needed:
+
+    python benchmarks/bench_forecasting.py --days 7 28 90 --sections 1 10 100 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import forecasting
+
+
+def synthetic(n_series, hours, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(hours)
+    scale = rng.uniform(5, 50, size=(n_series, 1))
+    return scale * (1.5 + np.sin(2 * np.pi * t / 24)) + rng.normal(0, 2, size=(n_series, hours))
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 28, 90])
+    parser.add_argument('--sections', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'days':>5} {'series':>7} {'vectorized ms':>14} {'per-series ms':>14} {'speedup':>8}")
+    for days in args.days:
+        for sections in args.sections:
+            y = synthetic(sections, days * 24)
+            vectorized = best_of(lambda: forecasting.fit(y), args.repeat)
+            # The looped baseline gets slow quickly; cap how many rows it fits and scale up
+            sample = y[:min(sections, 50)]
+            looped = best_of(lambda: [forecasting.fit(row[None, :]) for row in sample], 1) * sections / len(sample)
+            print(f"{days:>5} {sections:>7} {vectorized:>14.2f} {looped:>14.2f} {looped / vectorized:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
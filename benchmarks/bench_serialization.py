@@ -0,0 +1,86 @@
+"""Response encoding time for large row lists: response_model + JSONResponse vs FastJSONResponse.
+
+Loads real rows through VisitorCRUD.get_all and CashierCRUD.get_queue_history
+(repeating them if the tables are smaller than the requested size). Then it
+times the two ways a route can turn them into a response body:
+
+  before: response_model=List[dict] validation and serialization, then
+          JSONResponse (stdlib json), as FastAPI does for a returned list
+  after:  FastJSONResponse (orjson), returned directly by the route
+
+    DATABASE_URL=... python benchmarks/bench_serialization.py --rows 1000 10000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from async_crud import VisitorCRUD, CashierCRUD
+from async_database import adb
+from serialization import FastJSONResponse
+
+LIST_FIELD = create_response_field(name="Response_bench", type_=List[dict])
+
+
+async def encode_before(rows):
+    content = await serialize_response(field=LIST_FIELD, response_content=rows, is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def encode_after(rows):
+    return FastJSONResponse(rows).body
+
+
+async def best_of(encode, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = await encode(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings), len(body)
+
+
+def fill(rows, size):
+    """Repeat rows up to size so small local tables still give full-size payloads"""
+    if not rows:
+        raise SystemExit("No rows to encode; load some data first")
+    return (rows * (size // len(rows) + 1))[:size]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    await adb.open()
+    try:
+        largest = max(args.rows)
+        sources = {
+            'visitors get_all': await VisitorCRUD.get_all(limit=largest),
+            'cashier get_queue_history': await CashierCRUD.get_queue_history(hours=24 * 365, limit=largest),
+        }
+    finally:
+        await adb.close()
+
+    for name, rows in sources.items():
+        for size in args.rows:
+            batch = fill(rows, size)
+            before, before_bytes = await best_of(encode_before, batch, args.repeat)
+            after, after_bytes = await best_of(encode_after, batch, args.repeat)
+            print(f"{name}, {size} rows")
+            print(f"  response_model + json: {before * 1000:8.1f} ms  {before_bytes} bytes")
+            print(f"  FastJSONResponse:      {after * 1000:8.1f} ms  {after_bytes} bytes")
+            print(f"  speedup: {before / after:.1f}x")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""Read-through cache for hot CRUD calls.
+
+Entries are fresh for `ttl` seconds. For a further `stale_ttl` seconds they are
+still served while a single background task refreshes them. The default backend
+is an in-process LRU; set CACHE_BACKEND=redis (and REDIS_URL) to share entries
+between workers. Both backends store pickled values, so every hit is a private
+copy that callers may mutate.
+"""
+import asyncio
+import functools
+import os
+import pickle
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+class MemoryBackend:
+    """Bounded in-process LRU of (stored_at, pickled value) entries"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return stored_at, pickle.loads(value)
+
+    async def set(self, key: str, stored_at: float, value: Any, expire_after: float):
+        self._entries[key] = (stored_at + expire_after, stored_at, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete_prefix(self, prefix: str):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class RedisBackend:
+    """Shared backend; requires the optional `redis` package"""
+
+    def __init__(self, url: str, namespace: str = "retail-cache:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from e
+        self.namespace = namespace
+        self.evictions = 0  # Redis evicts on its own; not observable here
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        raw = await self._client.get(self.namespace + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, stored_at: float, value: Any, expire_after: float):
+        await self._client.set(self.namespace + key, pickle.dumps((stored_at, value)), px=max(int(expire_after * 1000), 1))
+
+    async def delete_prefix(self, prefix: str):
+        keys = [key async for key in self._client.scan_iter(match=f"{self.namespace}{prefix}*")]
+        if keys:
+            await self._client.delete(*keys)
+
+    def size(self) -> Optional[int]:
+        return None
+
+def _ttl_from_env(name: str, default: float) -> float:
+    return float(os.getenv(f"CACHE_TTL_{name.upper().replace('.', '_')}", default))
+
+class Cache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._refreshing = set()
+        self._tasks = set()
+        # Invalidations per name; a load that straddles one of its key's is returned but not stored
+        self._invalidations = {}
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_failures': 0}
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable], ttl: float, stale_ttl: float = 0):
+        entry = await self.backend.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age < ttl:
+                self._stats['hits'] += 1
+                return value
+            if age < ttl + stale_ttl:
+                self._stats['stale_hits'] += 1
+                self._refresh_in_background(key, loader, ttl, stale_ttl)
+                return value
+        self._stats['misses'] += 1
+        return await self._load(key, loader, ttl, stale_ttl)
+
+    async def _load(self, key, loader, ttl, stale_ttl):
+        generation = self._generation(key)
+        value = await loader()
+        if generation == self._generation(key):
+            await self.backend.set(key, time.time(), value, ttl + stale_ttl)
+        return value
+
+    def _refresh_in_background(self, key, loader, ttl, stale_ttl):
+        # At most one refresh per key is in flight in this process
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                await self._load(key, loader, ttl, stale_ttl)
+                self._stats['refreshes'] += 1
+            except Exception as e:
+                self._stats['refresh_failures'] += 1
+                print(f"Cache refresh for {key} failed: {e}")
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def cached(self, name: str, ttl: float, stale_ttl: float = 0):
+        """Decorate an async function; CACHE_TTL_<NAME> overrides ttl"""
+        ttl = _ttl_from_env(name, ttl)
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                key = name
+                if args or kwargs:
+                    key = f"{name}:{args!r}:{sorted(kwargs.items())!r}"
+                return await self.get_or_load(key, lambda: func(*args, **kwargs), ttl, stale_ttl)
+            return wrapper
+        return decorator
+
+    def _generation(self, key: str) -> int:
+        return sum(count for name, count in self._invalidations.items() if key.startswith(name))
+
+    async def invalidate(self, name: str):
+        self._invalidations[name] = self._invalidations.get(name, 0) + 1
+        await self.backend.delete_prefix(name)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats.update({
+            'backend': type(self.backend).__name__,
+            'entries': self.backend.size(),
+            'evictions': self.backend.evictions,
+            'refreshing': len(self._refreshing),
+        })
+        return stats
+
+def _default_backend():
+    if os.getenv("CACHE_BACKEND", "memory").lower() == "redis":
+        return RedisBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return MemoryBackend(int(os.getenv("CACHE_MAX_ENTRIES", 1024)))
+
+# Global cache instance
+cache = Cache(_default_backend())
@@ -1,95 +1,94 @@
-import streamlit as st 
-import openai
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-import os 
-from dotenv import load_dotenv
-load_dotenv()
- 
-
-os.environ["OPENAI_API_KEY"]= os.getenv("OPEN_API_KEY")
-os.environ["OPENAI_API_BASE"] = "https://openrouter.ai/api/v1"
-## langsmith Tracking 
-os.environ["LANGCHAIN_API_KEY"]= os.getenv("LANGCHAIN_API_KEY")
-os.environ["LANGCHAIN_TRACING_V2"]= "true"
-os.environ["LANGCHAIN_PROJECT"]="Q&A Chatbot with OPENAI"
-os.environ["OPENAI_MODEL_NAME"]="openai/gpt-oss-20b:free"
-
 import os
-import requests
+import time
 from dotenv import load_dotenv
 from langchain.agents import AgentType, initialize_agent, Tool
 from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import MessagesPlaceholder
 from langchain.tools import StructuredTool
+import chatbot_tools
+from chatbot_tools import get_current_visitors, get_busiest_section, get_cashier_queue, get_store_overview
+from chatbot_intents import fast_path
+from chatbot_cache import AnswerCache
+from chatbot_memory import SessionMemoryStore
 
 # Load environment
 load_dotenv()
 
-# --- Tools that call your Backend API ---
-BACKEND_URL = os.getenv("BACKEND_API_URL", "http://localhost:8000")
-
-def get_current_visitors() -> str:
-    """Fetches the current number of visitors in the store."""
-    try:
-        response = requests.get(f"{BACKEND_URL}/api/visitors/current")
-        data = response.json()
-        count = data.get("current_visitors", "N/A")
-        return f"There are currently {count} visitors in the store."
-    except Exception as e:
-        return f"Sorry, I couldn't fetch the visitor count. Error: {e}"
-
-def get_busiest_section() -> str:
-    """Finds which store section has the most visitors."""
-    try:
-        response = requests.get(f"{BACKEND_URL}/api/visitors/sections")
-        sections = response.json()
-        if sections:
-            busiest = sections[0]  # Assuming sorted by traffic
-            return f"The busiest section is '{busiest['section']}' with approximately {busiest['total_visitors']} visitors recently."
-        return "I couldn't find any section data at the moment."
-    except Exception as e:
-        return f"Sorry, I couldn't find the busiest section. Error: {e}"
-
-def get_cashier_queue() -> str:
-    """Gets the current cashier queue status and wait time."""
-    try:
-        response = requests.get(f"{BACKEND_URL}/api/cashier/current")
-        status = response.json()
-        if 'queue_length' in status:
-            wait = status.get('wait_time_minutes', status['queue_length'] * 2)
-            return f"The cashier queue has {status['queue_length']} people. Estimated wait time is {wait} minutes."
-        return "Cashier status is currently unavailable."
-    except Exception as e:
-        return f"Sorry, I couldn't get cashier status. Error: {e}"
+# Only export keys that are set, so the module imports cleanly inside the API
+if os.getenv("OPEN_API_KEY"):
+    os.environ["OPENAI_API_KEY"] = os.getenv("OPEN_API_KEY")
+os.environ.setdefault("OPENAI_API_BASE", "https://openrouter.ai/api/v1")
+## langsmith Tracking
+if os.getenv("LANGCHAIN_API_KEY"):
+    os.environ.setdefault("LANGCHAIN_TRACING_V2", "true")
+    os.environ.setdefault("LANGCHAIN_PROJECT", "Q&A Chatbot with OPENAI")
+os.environ.setdefault("OPENAI_MODEL_NAME", "openai/gpt-oss-20b:free")
 
 # --- Define Tools for LangChain ---
 tools = [
     StructuredTool.from_function(get_current_visitors),
     StructuredTool.from_function(get_busiest_section),
     StructuredTool.from_function(get_cashier_queue),
+    StructuredTool.from_function(get_store_overview),
 ]
 
 # --- Create the Agent with Memory ---
-llm = ChatOpenAI(model="amazon/nova-2-lite-v1:free", temperature=0, openai_api_key=os.getenv("OPEN_API_KEY"))
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+# streaming=True lets the API forward tokens as they are generated
+llm = ChatOpenAI(model="amazon/nova-2-lite-v1:free", temperature=0, openai_api_key=os.getenv("OPEN_API_KEY"), streaming=True)
 
 agent_kwargs = {
     "extra_prompt_messages": [MessagesPlaceholder(variable_name="chat_history")],
 }
 
+# No memory= here: a memory would save and summarize (an LLM call) synchronously as the
+# chain ends. Callers pass chat_history in and remember the turn themselves.
 agent = initialize_agent(
     tools,
     llm,
     agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
     verbose=True,
-    memory=memory,
     agent_kwargs=agent_kwargs,
     handle_parsing_errors=True
 )
 
+# One bounded memory per chat session
+sessions = SessionMemoryStore(llm)
+
+answer_cache = AnswerCache(lambda: chatbot_tools.backend.data_version())
+
+def quick_answer(query: str, session) -> str:
+    """Answer from the fast path or the answer cache, or None if the agent is needed"""
+    answer = fast_path.answer(query)
+    if answer is None and not session.has_history:
+        # Cached answers were built without history; follow-ups need this session's context
+        answer = answer_cache.get(query)
+    if answer is not None:
+        # Keep the exchange in memory so follow-up questions have context; summarizing is left
+        # to the caller, which may need to hold an LLM slot for it
+        session.remember(query, answer)
+    return answer
+
+def respond(query: str, session_id: str = "cli") -> str:
+    """Answer common questions directly or from cache; everything else goes to the agent"""
+    session = sessions.get(session_id)
+    answer = quick_answer(query, session)
+    if answer is not None:
+        if session.over_budget():
+            session.summarize()
+        return answer
+    cacheable = not session.has_history
+    version_read_at = time.time()
+    version = answer_cache.current_version() if cacheable else None
+    sessions.record_turn(session, sessions.count_prompt_tokens(session, query))
+    started = time.perf_counter()
+    response = agent.invoke({"input": query, "chat_history": session.history()})["output"]
+    fast_path.record_agent(time.perf_counter() - started)
+    answer_cache.put(query, response, version, version_read_at)
+    session.remember(query, response)
+    if session.over_budget():
+        session.summarize()
+    return response
+
 # --- Main Chat Loop ---
 if __name__ == "__main__":
     print("🤖 Retail Analytics Bot is ready! (Type 'quit' to exit)")
@@ -98,7 +97,10 @@ if __name__ == "__main__":
             query = input("\nYou: ")
             if query.lower() in ['quit', 'exit']:
                 break
-            response = agent.run(query)
+            if query.lower() == 'stats':
+                print(f"Bot: fast path {fast_path.stats()}, answer cache {answer_cache.stats()}, memory {sessions.stats()}")
+                continue
+            response = respond(query)
             print(f"Bot: {response}")
         except Exception as e:
             print(f"Bot: Sorry, I encountered an error. Please try again.")
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""Answer cache for the chatbot agent.
+
+Questions are normalized (case, punctuation, politeness and filler words), so
+near-duplicate phrasings share an entry. Word order and tense or time words
+("was", "now", "today") are kept, since they change the question. Answers are
+only cached for the first turn of a conversation: later turns depend on the
+session's history. Each entry remembers the data
+version it was built on: the newest ingest_xid (inserting transaction) of the
+visitor and cashier rows, read without the API cache. It moves on every
+commit, including backfills with old timestamps. An entry is reused only while it is younger than CHAT_CACHE_TTL, and
+only if the data has not changed since it was built or it is younger than
+CHAT_CACHE_MAX_STALENESS. Answers therefore never lag live data by more
+than the staleness bound.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+STOPWORDS = {
+    'a', 'an', 'the', 'please', 'me', 'tell', 'can', 'you', 'could', 'just', 'hey', 'hi',
+}
+
+def normalize(question: str) -> str:
+    words = re.findall(r"[a-z0-9]+", question.lower().replace("'", ""))
+    return " ".join(word for word in words if word not in STOPWORDS)
+
+class AnswerCache:
+    def __init__(self, version_source: Callable[[], object], max_entries: int = None,
+                 ttl: float = None, max_staleness: float = None):
+        self.version_source = version_source
+        self.max_entries = max_entries or int(os.getenv("CHAT_CACHE_SIZE", 256))
+        self.ttl = ttl or float(os.getenv("CHAT_CACHE_TTL", 600))
+        self.max_staleness = max_staleness if max_staleness is not None else float(os.getenv("CHAT_CACHE_MAX_STALENESS", 30))
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+
+    def current_version(self):
+        try:
+            return self.version_source()
+        except Exception as e:
+            print(f"Could not read data version, bypassing answer cache: {e}")
+            return None
+
+    def _unchanged_since(self, version) -> bool:
+        current = self.current_version()
+        return current is not None and current == version
+
+    def get(self, question: str) -> Optional[str]:
+        key = normalize(question)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            self._count('misses')
+            return None
+        built_at, version, answer = entry
+        age = time.time() - built_at
+        if age < self.ttl and (age <= self.max_staleness or self._unchanged_since(version)):
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            self._count('hits')
+            return answer
+        with self._lock:
+            self._entries.pop(key, None)
+        self._count('stale')
+        return None
+
+    def put(self, question: str, answer: str, version, read_at: float):
+        """Store answer; version and read_at must be taken before the data behind the answer was read"""
+        if version is None:
+            return
+        key = normalize(question)
+        with self._lock:
+            self._entries[key] = (read_at, version, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
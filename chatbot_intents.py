@@ -0,0 +1,107 @@
+"""Deterministic fast path for the chatbot's most common questions.
+
+A small regex classifier maps questions like "how many people are in the
+store" straight to the matching tool, skipping the LLM agent. The tools
+report the present moment, so questions about the past or about totals and
+averages fall through to the agent, as does anything open-ended or matching
+no intent.
+"""
+import re
+import threading
+import time
+from typing import Callable, List, Optional
+from chatbot_tools import get_current_visitors, get_busiest_section, get_cashier_queue, get_store_overview
+
+class Intent:
+    def __init__(self, name: str, tool: Callable[[], str], patterns: List[str]):
+        self.name = name
+        self.tool = tool
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+
+    def matches(self, question: str) -> bool:
+        return any(pattern.search(question) for pattern in self.patterns)
+
+INTENTS = [
+    Intent("current_visitors", get_current_visitors, [
+        r"\bhow many (people|visitors|customers|shoppers)\b",
+        r"\b(visitor|people|customer|shopper)s? count\b",
+        r"\bnumber of (people|visitors|customers|shoppers)\b",
+        r"\bhow (busy|crowded|full) is the store\b",
+    ]),
+    Intent("busiest_section", get_busiest_section, [
+        r"\b(busiest|most crowded|most popular|most visited)\b.*\b(section|aisle|area|department|zone)s?\b",
+        r"\b(section|aisle|area|department|zone)s?\b.*\b(busiest|most crowded|most popular|most visited)\b",
+        r"\bwhich (section|aisle|area|department|zone)\b.*\b(busy|crowded|most)\b",
+    ]),
+    Intent("cashier_queue", get_cashier_queue, [
+        r"\b(queue|checkout line)s?\b",
+        r"\b(cashier|till|checkout)s?\b.*\b(line|wait|busy|crowded)\b",
+        r"\b(line|wait|busy|crowded)\b.*\b(cashier|till|checkout)s?\b",
+        r"\bwait(ing)? time\b",
+        r"\bhow long\b.*\b(wait|line|checkout)\b",
+    ]),
+]
+
+# Questions that need reasoning, history or advice go to the agent
+OPEN_ENDED = re.compile(
+    r"\b(why|should|recommend|suggest|advice|compare|comparison|predict|forecast|trend|"
+    r"yesterday|last (week|month|year)|tomorrow|explain|improve|reduce|plan)\b",
+    re.IGNORECASE,
+)
+
+# The tools only know the current state; past or aggregate questions need the agent
+PAST_OR_AGGREGATE = re.compile(
+    r"\b(were|was|did|had|visited|today|tonight|this (morning|afternoon|evening)|so far|earlier|"
+    r"average|avg|mean|total|overall|peak|at \d)",
+    re.IGNORECASE,
+)
+
+class FastPath:
+    def __init__(self, intents: List[Intent] = INTENTS):
+        self.intents = intents
+        self._lock = threading.Lock()
+        self._stats = {'questions': 0, 'hits': 0, 'fallbacks': 0, 'fast_ms': 0.0, 'agent_calls': 0, 'agent_ms': 0.0}
+
+    def classify(self, question: str) -> Optional[Callable[[], str]]:
+        """Return the tool that fully answers question, or None if unsure"""
+        if OPEN_ENDED.search(question) or PAST_OR_AGGREGATE.search(question):
+            return None
+        matched = [intent for intent in self.intents if intent.matches(question)]
+        if len(matched) == 1:
+            return matched[0].tool
+        if len(matched) > 1:
+            return get_store_overview
+        return None
+
+    def answer(self, question: str) -> Optional[str]:
+        started = time.perf_counter()
+        tool = self.classify(question)
+        with self._lock:
+            self._stats['questions'] += 1
+            if tool is None:
+                self._stats['fallbacks'] += 1
+                return None
+        reply = tool()
+        with self._lock:
+            self._stats['hits'] += 1
+            self._stats['fast_ms'] += (time.perf_counter() - started) * 1000
+        return reply
+
+    def record_agent(self, seconds: float):
+        """Report how long a fallback agent call took, to estimate latency saved"""
+        with self._lock:
+            self._stats['agent_calls'] += 1
+            self._stats['agent_ms'] += seconds * 1000
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        avg_fast = stats['fast_ms'] / stats['hits'] if stats['hits'] else 0.0
+        avg_agent = stats['agent_ms'] / stats['agent_calls'] if stats['agent_calls'] else None
+        stats['hit_rate'] = round(stats['hits'] / stats['questions'], 3) if stats['questions'] else 0.0
+        stats['avg_fast_ms'] = round(avg_fast, 2)
+        stats['avg_agent_ms'] = round(avg_agent, 2) if avg_agent is not None else None
+        stats['est_saved_ms'] = round(stats['hits'] * (avg_agent - avg_fast), 1) if avg_agent is not None else None
+        return stats
+
+fast_path = FastPath()
@@ -0,0 +1,134 @@
+"""Per-session conversation memory for the chatbot.
+
+Each session gets its own SummaryMemory (a ConversationSummaryBufferMemory).
+Recent turns are kept verbatim up to CHAT_MEMORY_TOKENS, and older turns are
+folded into a rolling summary, so the prompt stops growing with conversation
+length. Token counts use the model's tokenizer when tiktoken knows the
+model, and a 4-characters-per-token estimate otherwise.
+Sessions idle longer than CHAT_SESSION_TTL, or beyond CHAT_MAX_SESSIONS
+(least recently used first), are evicted.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain.schema import AIMessage, BaseMessage, HumanMessage
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough 4-characters-per-token count, for models without a known tokenizer"""
+    return sum(len(str(message.content)) for message in messages) // 4
+
+class SummaryMemory(ConversationSummaryBufferMemory):
+    """ConversationSummaryBufferMemory whose token counts work for any model"""
+
+    # Set once the tokenizer failed, so later counts skip straight to the estimate
+    tokenizer_failed: bool = False
+
+    def count_tokens(self, messages: List[BaseMessage]) -> int:
+        if not self.tokenizer_failed:
+            try:
+                return self.llm.get_num_tokens_from_messages(messages)
+            except Exception:
+                # ChatOpenAI raises NotImplementedError for models tiktoken does not know
+                self.tokenizer_failed = True
+        return estimate_tokens(messages)
+
+    def prune(self) -> None:
+        """Fold the oldest turns into the summary while the buffer is over max_token_limit"""
+        buffer = self.chat_memory.messages
+        if self.count_tokens(buffer) <= self.max_token_limit:
+            return
+        pruned_memory = []
+        while buffer and self.count_tokens(buffer) > self.max_token_limit:
+            pruned_memory.append(buffer.pop(0))
+        self.moving_summary_buffer = self.predict_new_summary(pruned_memory, self.moving_summary_buffer)
+
+class Session:
+    def __init__(self, memory):
+        self.memory = memory
+        self.last_used = time.time()
+        self.turns = 0
+        self.last_prompt_tokens = 0
+        self.total_prompt_tokens = 0
+
+    @property
+    def has_history(self) -> bool:
+        """True once any turn was saved, verbatim or folded into the summary"""
+        return bool(self.memory.chat_memory.messages or self.memory.moving_summary_buffer)
+
+    def history(self) -> List[BaseMessage]:
+        """Summary plus verbatim turns, for the agent's chat_history input"""
+        return self.memory.load_memory_variables({})["chat_history"]
+
+    def remember(self, query: str, answer: str):
+        """Append an exchange verbatim; unlike save_context this never calls the LLM"""
+        self.memory.chat_memory.add_messages([HumanMessage(content=query), AIMessage(content=answer)])
+
+    def over_budget(self) -> bool:
+        """True when the verbatim turns exceed the token budget and summarize() is due"""
+        return self.memory.count_tokens(self.memory.chat_memory.messages) > self.memory.max_token_limit
+
+    def summarize(self):
+        """Fold the oldest verbatim turns into the rolling summary; this is an LLM call"""
+        self.memory.prune()
+
+class SessionMemoryStore:
+    def __init__(self, llm, max_sessions: int = None, idle_ttl: float = None, token_budget: int = None):
+        self.llm = llm
+        self.max_sessions = max_sessions or int(os.getenv("CHAT_MAX_SESSIONS", 1000))
+        self.idle_ttl = idle_ttl or float(os.getenv("CHAT_SESSION_TTL", 1800))
+        self.token_budget = token_budget or int(os.getenv("CHAT_MEMORY_TOKENS", 1000))
+        self._sessions: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'evicted_idle': 0, 'evicted_lru': 0, 'turns': 0, 'prompt_tokens': 0}
+
+    def get(self, session_id: str) -> Session:
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                memory = SummaryMemory(
+                    llm=self.llm,
+                    max_token_limit=self.token_budget,
+                    memory_key="chat_history",
+                    return_messages=True,
+                )
+                session = Session(memory)
+                self._sessions[session_id] = session
+                self._stats['created'] += 1
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self._stats['evicted_lru'] += 1
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            return session
+
+    def _evict_idle(self):
+        cutoff = time.time() - self.idle_ttl
+        # Oldest first, so stop at the first session still in use
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            del self._sessions[session_id]
+            self._stats['evicted_idle'] += 1
+
+    def count_prompt_tokens(self, session: Session, query: str) -> int:
+        """Tokens of history and question that the next LLM call will carry"""
+        return session.memory.count_tokens(session.history() + [HumanMessage(content=query)])
+
+    def record_turn(self, session: Session, prompt_tokens: int):
+        with self._lock:
+            session.turns += 1
+            session.last_prompt_tokens = prompt_tokens
+            session.total_prompt_tokens += prompt_tokens
+            self._stats['turns'] += 1
+            self._stats['prompt_tokens'] += prompt_tokens
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, sessions=len(self._sessions), token_budget=self.token_budget)
+        stats['avg_prompt_tokens'] = round(stats['prompt_tokens'] / stats['turns'], 1) if stats['turns'] else 0.0
+        return stats
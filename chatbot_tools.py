@@ -0,0 +1,213 @@
+"""Backend tools used by the chatbot agent.
+
+CHATBOT_TOOL_MODE picks how tools reach the data: "http" (default) calls the
+REST API through one pooled requests.Session with timeouts and bounded
+retries; "direct" calls the CRUD layer in-process when the bot runs inside
+the API deployment. Tool latency is recorded in TOOL_LATENCY.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+# Load environment
+load_dotenv()
+
+# --- Tools that call your Backend API ---
+BACKEND_URL = os.getenv("BACKEND_API_URL", "http://localhost:8000")
+CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", 2))
+READ_TIMEOUT = float(os.getenv("BACKEND_READ_TIMEOUT", 5))
+RETRIES = int(os.getenv("BACKEND_RETRIES", 2))
+TOOL_MODE = os.getenv("CHATBOT_TOOL_MODE", "http").lower()
+
+class ToolLatency:
+    """Thread-safe per-tool call counts and timings"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            stats = self._stats.setdefault(name, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0})
+            ms = seconds * 1000
+            stats['calls'] += 1
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+            stats['last_ms'] = ms
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: dict(stats, avg_ms=round(stats['total_ms'] / stats['calls'], 2))
+                for name, stats in self._stats.items()
+            }
+
+TOOL_LATENCY = ToolLatency()
+
+def timed(func):
+    """Record how long each call of a tool takes"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            TOOL_LATENCY.record(func.__name__, time.perf_counter() - started)
+    return wrapper
+
+class HttpBackend:
+    """Reads store metrics from the REST API over a pooled keep-alive session"""
+
+    def __init__(self, base_url: str = BACKEND_URL):
+        self.base_url = base_url.rstrip("/")
+        retry = Retry(
+            total=RETRIES,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _get(self, path: str):
+        response = self.session.get(f"{self.base_url}{path}", timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        response.raise_for_status()
+        return response.json()
+
+    def current_visitors(self):
+        return self._get("/api/visitors/current").get("current_visitors")
+
+    def section_traffic(self):
+        return self._get("/api/visitors/sections")
+
+    def cashier_status(self):
+        return self._get("/api/cashier/current")
+
+    def wait_estimate(self):
+        return self._get("/api/cashier/wait-time")
+
+    def data_version(self):
+        """Inserting transactions of the newest visitor and cashier rows, read past the API cache"""
+        version = self._get("/api/data-version")
+        return (version['visitors'], version['cashier'])
+
+_direct_loop = None
+
+def _background_loop():
+    """Event loop thread for direct calls when no API loop has been bound"""
+    global _direct_loop
+    if _direct_loop is None:
+        _direct_loop = asyncio.new_event_loop()
+        threading.Thread(target=_direct_loop.run_forever, name="chatbot-direct", daemon=True).start()
+    return _direct_loop
+
+class DirectBackend:
+    """Calls the cached async CRUD layer in-process, skipping HTTP and JSON"""
+
+    def __init__(self, loop=None):
+        # Imported here so HTTP mode does not need database drivers
+        from async_crud import VisitorCRUD, CashierCRUD, AnalyticsCRUD
+        import wait_time
+        self.visitors = VisitorCRUD
+        self.cashier = CashierCRUD
+        self.analytics = AnalyticsCRUD
+        self.wait_time = wait_time
+        self.loop = loop
+
+    def bind_loop(self, loop):
+        """Run CRUD calls on the API's event loop (and its connection pool)"""
+        self.loop = loop
+
+    def _run(self, coro):
+        loop = self.loop or _background_loop()
+        try:
+            calling_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            calling_loop = None
+        if calling_loop is loop:
+            coro.close()
+            raise RuntimeError("DirectBackend must be called from a worker thread, not the event loop")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=READ_TIMEOUT)
+
+    def current_visitors(self):
+        return self._run(self.visitors.get_current_count())
+
+    def section_traffic(self):
+        return self._run(self.visitors.get_section_traffic())
+
+    def cashier_status(self):
+        return self._run(self.cashier.get_current_status()) or {}
+
+    def wait_estimate(self):
+        return self._run(self.wait_time.current_estimate()) or {}
+
+    def data_version(self):
+        """Inserting transactions of the newest visitor and cashier rows, read past the API cache"""
+        version = self._run(self.analytics.get_data_version())
+        return (version['visitors'], version['cashier'])
+
+backend = DirectBackend() if TOOL_MODE == "direct" else HttpBackend()
+
+# Runs independent tool calls side by side
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="chatbot-tool")
+
+@timed
+def get_current_visitors() -> str:
+    """Fetches the current number of visitors in the store."""
+    try:
+        count = backend.current_visitors()
+        return f"There are currently {count if count is not None else 'N/A'} visitors in the store."
+    except Exception as e:
+        return f"Sorry, I couldn't fetch the visitor count. Error: {e}"
+
+@timed
+def get_busiest_section() -> str:
+    """Finds which store section has the most visitors."""
+    try:
+        sections = backend.section_traffic()
+        if sections:
+            busiest = sections[0]  # Assuming sorted by traffic
+            return f"The busiest section is '{busiest['section']}' with approximately {busiest['total_visitors']} visitors recently."
+        return "I couldn't find any section data at the moment."
+    except Exception as e:
+        return f"Sorry, I couldn't find the busiest section. Error: {e}"
+
+@timed
+def get_cashier_queue() -> str:
+    """Gets the current cashier queue status and wait time."""
+    try:
+        status = backend.cashier_status()
+        if 'queue_length' in status:
+            wait = status.get('wait_time_minutes')
+            if wait is not None:
+                return f"The cashier queue has {status['queue_length']} people. Estimated wait time is {wait} minutes."
+            estimate = backend.wait_estimate()
+            if 'estimated_wait_minutes' not in estimate:
+                return f"The cashier queue has {status['queue_length']} people. No wait estimate is available yet."
+            reply = (f"The cashier queue has {status['queue_length']} people. "
+                     f"Estimated wait time is {estimate['estimated_wait_minutes']} minutes")
+            if estimate.get('lower_minutes') != estimate.get('upper_minutes'):
+                reply += f" (likely {estimate['lower_minutes']}-{estimate['upper_minutes']})"
+            return reply + "."
+        return "Cashier status is currently unavailable."
+    except Exception as e:
+        return f"Sorry, I couldn't get cashier status. Error: {e}"
+
+def run_concurrently(*tool_funcs):
+    """Call independent zero-argument tools in parallel, returning results in order"""
+    futures = [_executor.submit(func) for func in tool_funcs]
+    return [future.result() for future in futures]
+
+@timed
+def get_store_overview() -> str:
+    """Gets visitor count, busiest section and cashier queue together in one step."""
+    return " ".join(run_concurrently(get_current_visitors, get_busiest_section, get_cashier_queue))
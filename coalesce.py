@@ -0,0 +1,40 @@
+"""Single-flight coalescing: concurrent identical calls share one execution"""
+import asyncio
+import functools
+from typing import Awaitable, Callable, Dict
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats = {'calls': 0, 'executions': 0, 'deduplicated': 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        self._stats['calls'] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats['executions'] += 1
+            # A separate task, so a cancelled caller does not cancel the others
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._stats['deduplicated'] += 1
+        return await asyncio.shield(task)
+
+    def coalesced(self, name: str):
+        """Decorate an async function so concurrent calls with equal arguments coalesce"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                key = name
+                if args or kwargs:
+                    key = f"{name}:{args!r}:{sorted(kwargs.items())!r}"
+                return await self.do(key, lambda: func(*args, **kwargs))
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return dict(self._stats, in_flight=len(self._inflight))
+
+# Global coalescing group for CRUD reads
+single_flight = SingleFlight()
@@ -145,49 +145,28 @@ class AnalyticsCRUD:
             # Get today's date at midnight
             today_start = datetime.combine(date.today(), datetime.min.time())
             
-            # Total visitors today
+            # Total, busiest section, average queue and peak hour in one pass
             cur.execute("""
-                SELECT SUM(count) as total_visitors
-                FROM visitors 
-                WHERE timestamp >= %s
-            """, (today_start,))
-            visitors_result = cur.fetchone()
-            
-            # Busiest section
-            cur.execute("""
-                SELECT section, SUM(count) as total
-                FROM visitors 
-                WHERE timestamp >= %s
-                GROUP BY section 
-                ORDER BY total DESC 
-                LIMIT 1
-            """, (today_start,))
-            busiest_result = cur.fetchone()
-            
-            # Average queue length today
-            cur.execute("""
-                SELECT AVG(queue_length) as avg_queue
-                FROM cashier 
-                WHERE timestamp >= %s
-            """, (today_start,))
-            queue_result = cur.fetchone()
-            
-            # Peak hour (hour with most visitors)
-            cur.execute("""
-                SELECT EXTRACT(HOUR FROM timestamp) as hour,
-                       SUM(count) as total_visitors
-                FROM visitors 
-                WHERE timestamp >= %s
-                GROUP BY EXTRACT(HOUR FROM timestamp)
-                ORDER BY total_visitors DESC 
-                LIMIT 1
-            """, (today_start,))
-            peak_result = cur.fetchone()
+                WITH today_visitors AS (
+                    SELECT timestamp, section, count
+                    FROM visitors 
+                    WHERE timestamp >= %(since)s
+                )
+                SELECT
+                    (SELECT SUM(count) FROM today_visitors) as total_visitors,
+                    (SELECT section FROM today_visitors
+                     GROUP BY section ORDER BY SUM(count) DESC LIMIT 1) as busiest_section,
+                    (SELECT EXTRACT(HOUR FROM timestamp) FROM today_visitors
+                     GROUP BY EXTRACT(HOUR FROM timestamp) ORDER BY SUM(count) DESC LIMIT 1) as peak_hour,
+                    (SELECT AVG(queue_length) FROM cashier
+                     WHERE timestamp >= %(since)s) as avg_queue
+            """, {'since': today_start})
+            result = cur.fetchone()
             
             return {
-                'total_visitors_today': visitors_result['total_visitors'] or 0,
-                'busiest_section': busiest_result['section'] if busiest_result else 'N/A',
-                'avg_queue_length': round(queue_result['avg_queue'] or 0, 1),
-                'peak_hour': f"{int(peak_result['hour'] or 0)}:00" if peak_result else 'N/A',
+                'total_visitors_today': result['total_visitors'] or 0,
+                'busiest_section': result['busiest_section'] or 'N/A',
+                'avg_queue_length': round(result['avg_queue'] or 0, 1),
+                'peak_hour': f"{int(result['peak_hour'])}:00" if result['peak_hour'] is not None else 'N/A',
                 'timestamp': datetime.now()
             }
\ No newline at end of file
@@ -1,33 +1,139 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import psycopg2
+from psycopg2 import extensions, pool
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
 
 load_dotenv()
 
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no pooled connection becomes available in time"""
+
 class Database:
-    def __init__(self):
+    def __init__(self, min_size=None, max_size=None, acquire_timeout=None, idle_check_after=None):
         self.connection_string = os.getenv('DATABASE_URL')
-    
+        self.sslmode = os.getenv('DB_SSLMODE', 'require')
+        self.min_size = min_size if min_size is not None else int(os.getenv('DB_POOL_MIN', 1))
+        self.max_size = max_size if max_size is not None else int(os.getenv('DB_POOL_MAX', 10))
+        # Seconds to wait for a free connection before giving up
+        self.acquire_timeout = acquire_timeout if acquire_timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 5))
+        # Connections idle longer than this are pinged before being handed out
+        self.idle_check_after = idle_check_after if idle_check_after is not None else float(os.getenv('DB_POOL_IDLE_CHECK', 30))
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._last_used = {}
+        self._stats = {
+            'acquired': 0,
+            'waited': 0,
+            'timeouts': 0,
+            'replaced': 0,
+            'in_use': 0,
+        }
+
+    def _get_pool(self):
+        if self._pool is None or self._pool.closed:
+            with self._lock:
+                if self._pool is None or self._pool.closed:
+                    self._pool = pool.ThreadedConnectionPool(
+                        self.min_size,
+                        self.max_size,
+                        self.connection_string,
+                        cursor_factory=RealDictCursor,
+                        sslmode=self.sslmode
+                    )
+                    # putconn closes returned connections once minconn are idle; the
+                    # semaphore already caps the pool, so keep every returned connection
+                    # (min_size still decides how many are opened up front)
+                    self._pool.minconn = self.max_size
+        return self._pool
+
+    def _is_healthy(self, conn):
+        """Ping connections that sat idle long enough to have been dropped server-side"""
+        if conn.closed:
+            return False
+        idle_since = self._last_used.get(id(conn))
+        if idle_since is not None and time.monotonic() - idle_since < self.idle_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['waited'] += 1
+            if not self._slots.acquire(timeout=self.acquire_timeout):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise PoolTimeoutError(
+                    f"Timed out after {self.acquire_timeout}s waiting for a database connection"
+                )
+        try:
+            connection_pool = self._get_pool()
+            # Each discard drops an idle connection, so within max_size + 1 tries the pool has
+            # to open a new one; if even that fails its ping the server is the problem
+            for _ in range(self.max_size + 1):
+                conn = connection_pool.getconn()
+                if self._is_healthy(conn):
+                    break
+                connection_pool.putconn(conn, close=True)
+                self._last_used.pop(id(conn), None)
+                with self._lock:
+                    self._stats['replaced'] += 1
+            else:
+                raise psycopg2.OperationalError("No healthy database connection could be opened")
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats['acquired'] += 1
+            self._stats['in_use'] += 1
+        return conn
+
+    def _release(self, conn):
+        discard = conn.closed
+        if not discard and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=discard)
+        except pool.PoolError:
+            # Borrowed before close(): closeall already closed it, or a reopened pool never owned it
+            conn.close()
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
     @contextmanager
     def get_connection(self):
-        """Get a database connection with automatic cleanup"""
+        """Borrow a pooled database connection and return it on exit"""
         conn = None
         try:
-            conn = psycopg2.connect(
-                self.connection_string,
-                cursor_factory=RealDictCursor,
-                sslmode='require'
-            )
+            conn = self._acquire()
             yield conn
         except psycopg2.OperationalError as e:
             print(f"Database connection failed: {e}")
             raise
         finally:
             if conn:
-                conn.close()
-    
+                self._release(conn)
+
     @contextmanager
     def get_cursor(self):
         """Get a database cursor with automatic cleanup"""
@@ -42,6 +148,26 @@ class Database:
             finally:
                 cursor.close()
 
+    def pool_stats(self):
+        """Snapshot of pool usage counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            open_connections = len(self._pool._pool) + len(self._pool._used) if self._pool and not self._pool.closed else 0
+        stats.update({
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'open': open_connections,
+            'idle': open_connections - stats['in_use'],
+        })
+        return stats
+
+    def close(self):
+        """Close every pooled connection; the next acquire opens a fresh pool"""
+        with self._lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+                self._last_used.clear()
+
 # Global database instance
 db = Database()
 
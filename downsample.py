@@ -0,0 +1,40 @@
+"""Largest-Triangle-Three-Buckets (LTTB) downsampling for charts.
+
+LTTB keeps the first and last points and splits the rest into equal buckets.
+From each bucket it keeps the point that forms the largest triangle with the
+previously kept point and the average of the next bucket. Peaks and dips
+survive, which plain averaging or striding would flatten.
+"""
+import numpy as np
+
+def lttb(x, y, threshold: int) -> np.ndarray:
+    """Indices of at most threshold points of (x, y) to keep, in order; x must be sorted"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    buckets = threshold - 2
+    # Bucket i holds points edges[i]..edges[i + 1] - 1; the first and last points stay outside
+    edges = (np.arange(buckets + 1) * ((n - 2) / buckets)).astype(np.intp) + 1
+    edges[-1] = n - 1
+    sums_x = np.concatenate(([0.0], np.cumsum(x)))
+    sums_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = edges[1:] - edges[:-1]
+    mean_x = (sums_x[edges[1:]] - sums_x[edges[:-1]]) / sizes
+    mean_y = (sums_y[edges[1:]] - sums_y[edges[:-1]]) / sizes
+    # The bucket after the last one is the final point itself
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for i in range(buckets):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[anchor], y[anchor]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        anchor = lo + int(np.argmax(area))
+        selected[i + 1] = anchor
+    return selected
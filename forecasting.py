@@ -0,0 +1,212 @@
+"""Hourly forecasts of store traffic and cashier queues.
+
+History is read in bulk from the hourly rollups as one matrix per run: store
+total visitors, visitors per section and average cashier queue, one row per
+series. Two models are fitted across all rows at once with NumPy. The first
+is seasonal naive, with a daily season. The second is additive Holt-Winters
+with a damped trend. For each series the model with the lower one-step error
+wins. Prediction intervals come from residual spread, widened per horizon.
+Store-level forecasts are written to the predictions table through the COPY
+ingest path, by one worker per interval. Per-section forecasts are kept in
+memory, since the table has no section column, so every worker fits.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from statistics import NormalDist
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from async_database import adb
+from background import PeriodicTask
+from cache import cache
+from ingest import write_batch
+from models import PredictionCreate
+
+SEASON = 24  # hours
+HORIZONS = {'1h': 1, '4h': 4, '8h': 8, '1d': 24, '7d': 168}
+FORECAST_INTERVAL = float(os.getenv('FORECAST_INTERVAL', 900))
+HISTORY_DAYS = int(os.getenv('FORECAST_HISTORY_DAYS', 28))
+INTERVAL_LEVEL = float(os.getenv('FORECAST_INTERVAL_LEVEL', 0.9))
+# Holt-Winters smoothing: level, trend, season, trend damping
+ALPHA = float(os.getenv('FORECAST_ALPHA', 0.3))
+BETA = float(os.getenv('FORECAST_BETA', 0.05))
+GAMMA = float(os.getenv('FORECAST_GAMMA', 0.2))
+PHI = float(os.getenv('FORECAST_PHI', 0.98))
+WRITE_LOCK_KEY = 7_305_115
+# Skip the write when another worker wrote within most of an interval
+WRITE_MIN_AGE = FORECAST_INTERVAL * 0.9
+
+def seasonal_naive(y: np.ndarray, m: int, horizon: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Repeat the last season; returns (point, sigma, residuals), point and sigma shaped (series, horizon)"""
+    steps = np.arange(horizon)
+    point = y[:, y.shape[1] - m + steps % m]
+    residuals = y[:, m:] - y[:, :-m]
+    sigma = residuals.std(axis=1, ddof=1)[:, None] * np.sqrt(steps // m + 1)
+    return point, sigma, residuals
+
+def holt_winters(y: np.ndarray, m: int, horizon: int, alpha: float = ALPHA, beta: float = BETA,
+                 gamma: float = GAMMA, phi: float = PHI) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Additive damped Holt-Winters; same return shape as seasonal_naive"""
+    n_series, length = y.shape
+    level = y[:, :m].mean(axis=1)
+    trend = (y[:, m:2 * m].mean(axis=1) - level) / m
+    season = y[:, :m] - level[:, None]
+    residuals = np.empty((n_series, length - m))
+    # The recursion runs over time; every step updates all series together
+    for t in range(m, length):
+        s = season[:, t % m]
+        base = level + phi * trend
+        residuals[:, t - m] = y[:, t] - (base + s)
+        new_level = alpha * (y[:, t] - s) + (1 - alpha) * base
+        trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        season[:, t % m] = gamma * (y[:, t] - new_level) + (1 - gamma) * s
+        level = new_level
+
+    steps = np.arange(1, horizon + 1)
+    damping = np.cumsum(phi ** steps)
+    point = level[:, None] + damping[None, :] * trend[:, None] + season[:, (length + steps - 1) % m]
+    # h-step variance multiplier of the additive model: 1 + sum of c_j^2 for j < h
+    j = np.arange(1, horizon)
+    c = alpha * (1 + beta * phi * (1 - phi ** j) / (1 - phi)) + gamma * (j % m == 0)
+    multiplier = np.sqrt(1 + np.concatenate(([0.0], np.cumsum(c ** 2))))
+    sigma = residuals.std(axis=1, ddof=1)[:, None] * multiplier[None, :]
+    return point, sigma, residuals
+
+def fit(y: np.ndarray, m: int = SEASON, horizon: int = max(HORIZONS.values()),
+        level: float = INTERVAL_LEVEL) -> Dict[str, np.ndarray]:
+    """Fit both models to every row of y and keep the better one per row"""
+    if y.shape[1] < 2 * m + 1:
+        # Not two full seasons yet: flat forecast at the mean
+        mean, std = y.mean(axis=1, keepdims=True), y.std(axis=1, keepdims=True)
+        point, sigma = np.repeat(mean, horizon, axis=1), np.repeat(std, horizon, axis=1)
+        model = np.full(y.shape[0], 'mean', dtype=object)
+    else:
+        naive_point, naive_sigma, naive_residuals = seasonal_naive(y, m, horizon)
+        hw_point, hw_sigma, hw_residuals = holt_winters(y, m, horizon)
+        use_hw = np.abs(hw_residuals).mean(axis=1) < np.abs(naive_residuals).mean(axis=1)
+        point = np.where(use_hw[:, None], hw_point, naive_point)
+        sigma = np.where(use_hw[:, None], hw_sigma, naive_sigma)
+        model = np.where(use_hw, 'holt_winters', 'seasonal_naive').astype(object)
+    half_width = NormalDist().inv_cdf(0.5 + level / 2) * sigma
+    # Counts and queue lengths cannot go negative
+    return {
+        'point': np.clip(point, 0, None),
+        'lower': np.clip(point - half_width, 0, None),
+        'upper': np.clip(point + half_width, 0, None),
+        # 1 for a zero-width interval, falling as the interval grows relative to the forecast
+        'confidence': 1 / (1 + half_width / np.maximum(np.abs(point), 1)),
+        'model': model,
+    }
+
+async def load_history(days: int = HISTORY_DAYS) -> Tuple[List[str], np.ndarray, datetime]:
+    """Hourly series matrix (one row per series) over complete hours, plus the last hour covered"""
+    end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    async with adb.get_cursor() as cur:
+        await cur.execute("""
+            SELECT bucket, section, total_visitors FROM visitor_rollup_hour
+            WHERE bucket >= %s AND bucket < %s
+        """, (start, end))
+        visitor_rows = await cur.fetchall()
+        await cur.execute("""
+            SELECT bucket, queue_sum::float / NULLIF(records_count, 0) AS avg_queue FROM cashier_rollup_hour
+            WHERE bucket >= %s AND bucket < %s
+        """, (start, end))
+        cashier_rows = await cur.fetchall()
+
+    sections = sorted({row['section'] for row in visitor_rows})
+    names = ['visitors', 'cashier_queue'] + [f'visitors:{section}' for section in sections]
+    hours = int((end - start).total_seconds() // 3600)
+    # Hours without rows had no detections: counted as zero
+    y = np.zeros((len(names), hours))
+    section_row = {section: 2 + i for i, section in enumerate(sections)}
+    for row in visitor_rows:
+        y[section_row[row['section']], int((row['bucket'] - start).total_seconds() // 3600)] = row['total_visitors']
+    for row in cashier_rows:
+        y[1, int((row['bucket'] - start).total_seconds() // 3600)] = row['avg_queue'] or 0
+    y[0] = y[2:].sum(axis=0)
+    # Drop the leading stretch before any data was collected
+    observed = np.flatnonzero(y.any(axis=0))
+    first = observed[0] if len(observed) else hours
+    return names, y[:, first:], end - timedelta(hours=1)
+
+latest: Dict[str, Any] = {'series': {}, 'fitted_at': None, 'history_hours': 0}
+
+def _summarize(names: List[str], result: Dict[str, np.ndarray], last_hour: datetime) -> Dict[str, Dict]:
+    series = {}
+    for i, name in enumerate(names):
+        series[name] = {
+            'model': result['model'][i],
+            'horizons': {
+                horizon: {
+                    'target_hour': last_hour + timedelta(hours=steps),
+                    'predicted_value': round(float(result['point'][i, steps - 1]), 2),
+                    'lower': round(float(result['lower'][i, steps - 1]), 2),
+                    'upper': round(float(result['upper'][i, steps - 1]), 2),
+                    'confidence_level': round(float(result['confidence'][i, steps - 1]), 3),
+                }
+                for horizon, steps in HORIZONS.items()
+            },
+        }
+    return series
+
+@asynccontextmanager
+async def _write_turn():
+    """Yield True in the one worker that should write this round's predictions"""
+    # Same try-lock as schema.py: the lock keeps overlapping runs apart, and the age check
+    # skips a worker whose timer fires just after another worker wrote
+    async with adb.get_connection() as conn:
+        await conn.set_autocommit(True)
+        try:
+            cur = await conn.execute("SELECT pg_try_advisory_lock(%s) AS locked", (WRITE_LOCK_KEY,))
+            if not (await cur.fetchone())['locked']:
+                yield False
+                return
+            try:
+                cur = await conn.execute("""
+                    SELECT COALESCE(MAX(prediction_timestamp) < NOW() - make_interval(secs => %s), TRUE) AS due
+                    FROM predictions
+                    WHERE metric_type = 'visitors' AND forecast_horizon = '1h'
+                """, (WRITE_MIN_AGE,))
+                yield (await cur.fetchone())['due']
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(%s)", (WRITE_LOCK_KEY,))
+        finally:
+            await conn.set_autocommit(False)
+
+async def run():
+    """Fit all series, write store-level predictions and refresh the in-memory forecasts"""
+    names, y, last_hour = await load_history()
+    if y.shape[1] == 0:
+        return 0
+    started = time.perf_counter()
+    # NumPy releases the GIL for most of the work; keep it off the event loop
+    result = await asyncio.to_thread(fit, y)
+    fit_seconds = time.perf_counter() - started
+    series = _summarize(names, result, last_hour)
+    records = [
+        PredictionCreate(
+            metric_type=name,
+            predicted_value=forecast['predicted_value'],
+            confidence_level=forecast['confidence_level'],
+            forecast_horizon=horizon,
+        )
+        for name in ('visitors', 'cashier_queue')
+        for horizon, forecast in series[name]['horizons'].items()
+    ]
+    written = 0
+    async with _write_turn() as due:
+        if due:
+            written = await write_batch('predictions', records)
+            await cache.invalidate("predictions.latest")
+    latest.update(
+        series=series,
+        fitted_at=datetime.now(timezone.utc),
+        history_hours=y.shape[1],
+        fit_ms=round(fit_seconds * 1000, 2),
+    )
+    return written
+
+forecast_task = PeriodicTask("forecasting", run, FORECAST_INTERVAL, initial_delay=float(os.getenv('FORECAST_INITIAL_DELAY', 15)))
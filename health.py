@@ -0,0 +1,59 @@
+"""Cached database diagnostics for health endpoints.
+
+Row counts come from the planner's catalog estimates (pg_class.reltuples,
+falling back to pg_stat live tuples for tables never analyzed, summed over
+partitions) instead of COUNT(*). A background task refreshes them every
+HEALTH_REFRESH_INTERVAL seconds. Probes read the last snapshot and never touch the tables.
+"""
+import os
+import time
+from datetime import datetime
+from async_database import adb
+from background import PeriodicTask
+
+TABLES = ('visitors', 'cashier', 'heatmap', 'predictions')
+REFRESH_INTERVAL = float(os.getenv("HEALTH_REFRESH_INTERVAL", 30))
+
+# Partitioned tables have no storage of their own: sum over their leaf partitions
+TABLE_STATS_SQL = """
+    SELECT t.table_name,
+           SUM(CASE WHEN c.reltuples >= 0 THEN c.reltuples
+                    ELSE COALESCE(s.n_live_tup, 0) END)::bigint AS estimated_rows,
+           SUM(pg_total_relation_size(c.oid))::bigint AS total_bytes,
+           MAX(GREATEST(s.last_analyze, s.last_autoanalyze)) AS last_analyzed,
+           COUNT(*) AS partitions
+    FROM unnest(%s::text[]) AS t(table_name)
+    LEFT JOIN LATERAL pg_partition_tree(to_regclass('public.' || t.table_name)) tree ON true
+    JOIN pg_class c ON c.oid = COALESCE(tree.relid, to_regclass('public.' || t.table_name))
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE tree.isleaf IS NOT FALSE
+    GROUP BY t.table_name
+"""
+
+_snapshot = {'status': 'unknown', 'tables': {}, 'refreshed_at': None, 'error': None}
+
+async def refresh():
+    """Take a new catalog snapshot; on failure keep the old table stats and record the error"""
+    started = time.perf_counter()
+    try:
+        async with adb.get_cursor() as cur:
+            await cur.execute(TABLE_STATS_SQL, (list(TABLES),))
+            rows = await cur.fetchall()
+    except Exception as e:
+        _snapshot.update(status='unhealthy', error=str(e), refreshed_at=datetime.now())
+        raise
+    _snapshot.update(
+        status='healthy',
+        tables={row['table_name']: row for row in rows},
+        refreshed_at=datetime.now(),
+        query_ms=round((time.perf_counter() - started) * 1000, 2),
+        error=None,
+    )
+
+def snapshot():
+    """Last diagnostics snapshot, with its age in seconds"""
+    refreshed_at = _snapshot['refreshed_at']
+    age = (datetime.now() - refreshed_at).total_seconds() if refreshed_at else None
+    return dict(_snapshot, age_s=round(age, 1) if age is not None else None)
+
+stats_task = PeriodicTask("health", refresh, REFRESH_INTERVAL)
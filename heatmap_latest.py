@@ -0,0 +1,85 @@
+"""Latest heatmap row per section, kept current by the database.
+
+heatmap_latest holds one row per section. A statement-level trigger on heatmap
+reads the inserted rows from its transition table and upserts the newest
+row per section. A COPY batch therefore costs one upsert, not one per row,
+and rows arriving out of order never replace newer state. Reads of the
+current heatmap scan O(sections) rows instead of the whole history.
+"""
+from async_database import adb
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS heatmap_latest (
+        section TEXT PRIMARY KEY,
+        id INTEGER NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        density_level TEXT NOT NULL,
+        coordinates JSONB,
+        visitor_count INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION heatmap_latest_upsert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO heatmap_latest AS l (section, id, timestamp, density_level, coordinates, visitor_count)
+        SELECT DISTINCT ON (section) section, id, timestamp, density_level, coordinates, visitor_count
+        FROM new_rows
+        ORDER BY section, timestamp DESC, id DESC
+        ON CONFLICT (section) DO UPDATE SET
+            id = EXCLUDED.id,
+            timestamp = EXCLUDED.timestamp,
+            density_level = EXCLUDED.density_level,
+            coordinates = EXCLUDED.coordinates,
+            visitor_count = EXCLUDED.visitor_count
+        WHERE (l.timestamp, l.id) <= (EXCLUDED.timestamp, EXCLUDED.id);
+        RETURN NULL;
+    END
+    $$
+    """,
+]
+
+# Created only when missing: CREATE INDEX and CREATE TRIGGER lock their table
+# (for the trigger, heatmap and every partition) against inserts, even with
+# IF NOT EXISTS, and ingestion should not wait on that at every startup
+INDEX_SQL = "CREATE INDEX heatmap_latest_density_idx ON heatmap_latest (density_level)"
+
+TRIGGER_SQL = """
+    CREATE TRIGGER heatmap_latest_sync
+    AFTER INSERT ON heatmap
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION heatmap_latest_upsert()
+"""
+
+# Seeds the table from history once; afterwards the trigger keeps it current
+BACKFILL_SQL = """
+    INSERT INTO heatmap_latest AS l (section, id, timestamp, density_level, coordinates, visitor_count)
+    SELECT DISTINCT ON (section) section, id, timestamp, density_level, coordinates, visitor_count
+    FROM heatmap
+    WHERE NOT EXISTS (SELECT 1 FROM heatmap_latest)
+    ORDER BY section, timestamp DESC, id DESC
+    ON CONFLICT (section) DO UPDATE SET
+        id = EXCLUDED.id,
+        timestamp = EXCLUDED.timestamp,
+        density_level = EXCLUDED.density_level,
+        coordinates = EXCLUDED.coordinates,
+        visitor_count = EXCLUDED.visitor_count
+    WHERE (l.timestamp, l.id) <= (EXCLUDED.timestamp, EXCLUDED.id)
+"""
+
+async def ensure_tables():
+    """Create the table and trigger, then backfill, in one transaction so no insert is missed"""
+    async with adb.get_cursor() as cur:
+        for statement in SCHEMA:
+            await cur.execute(statement)
+        await cur.execute("SELECT to_regclass('heatmap_latest_density_idx') IS NULL AS missing")
+        if (await cur.fetchone())['missing']:
+            await cur.execute(INDEX_SQL)
+        await cur.execute("""
+            SELECT 1 FROM pg_trigger
+            WHERE tgrelid = 'heatmap'::regclass AND tgname = 'heatmap_latest_sync' AND tgparentid = 0
+        """)
+        if await cur.fetchone() is None:
+            await cur.execute(TRIGGER_SQL)
+        await cur.execute(BACKFILL_SQL)
@@ -0,0 +1,212 @@
+"""Rasterized heatmaps from detection coordinates.
+
+heatmap.coordinates is expected to hold {"points": [[x, y], ...]}, with
+positions as fractions (0-1) of the section's width and height. Points
+are binned per section into fixed time slots of RASTER_SLOT_MINUTES at
+BASE_RESOLUTION, with one 2D histogram per slot. Rows are binned once, as
+they commit: like the rollups, the store keeps an ingest_xid watermark and
+reads the rows below the oldest running transaction, so rows that commit
+late still reach their slot. A slot is shown once it closes (plus a grace
+period). The last RASTER_MAX_WINDOW_MINUTES of slots are kept in memory. A
+raster for any window is the sum of its slots. It is block-summed down to
+the requested resolution and optionally Gaussian smoothed. Rendered rasters
+are cached in their own small cache until the shown data changes.
+"""
+import asyncio
+import os
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+import numpy as np
+from async_database import adb
+from background import PeriodicTask
+from cache import Cache, MemoryBackend
+
+BASE_RESOLUTION = 128
+RESOLUTIONS = (16, 32, 64, 128)
+SLOT_MINUTES = int(os.getenv('RASTER_SLOT_MINUTES', 5))
+MAX_WINDOW_MINUTES = int(os.getenv('RASTER_MAX_WINDOW_MINUTES', 120))
+# A slot is shown this long after it ends, so most of its rows are in
+GRACE_SECONDS = float(os.getenv('RASTER_GRACE_SECONDS', 30))
+# Smoothing radii are rounded to this step, so near-equal sigmas share a cache entry
+SIGMA_STEP = 0.25
+
+# Rendered images are large; keep them out of the shared cache of hot CRUD reads
+raster_cache = Cache(MemoryBackend(int(os.getenv('RASTER_CACHE_ENTRIES', 64))))
+
+POINTS_SQL = """
+    SELECT section,
+           to_timestamp(floor(extract(epoch FROM timestamp) / %(slot)s) * %(slot)s) AS slot,
+           array_agg(x) AS xs, array_agg(y) AS ys
+    FROM (
+        SELECT h.section, h.timestamp, (p->>0)::float8 AS x, (p->>1)::float8 AS y
+        FROM heatmap h,
+             jsonb_array_elements(CASE WHEN jsonb_typeof(h.coordinates->'points') = 'array'
+                                       THEN h.coordinates->'points' ELSE '[]'::jsonb END) p
+        WHERE {where} AND h.timestamp >= %(start)s AND jsonb_typeof(p) = 'array'
+    ) points
+    WHERE x IS NOT NULL AND y IS NOT NULL
+    GROUP BY section, slot
+"""
+
+def histogram(xs, ys, resolution: int = BASE_RESOLUTION) -> np.ndarray:
+    """Count points per cell; rows are y, columns x; points outside [0, 1] are dropped"""
+    xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+    inside = (xs >= 0) & (xs <= 1) & (ys >= 0) & (ys <= 1)
+    ix = np.minimum((xs[inside] * resolution).astype(np.intp), resolution - 1)
+    iy = np.minimum((ys[inside] * resolution).astype(np.intp), resolution - 1)
+    counts = np.bincount(iy * resolution + ix, minlength=resolution * resolution)
+    return counts.reshape(resolution, resolution).astype(np.float32)
+
+def downsample(raster: np.ndarray, resolution: int) -> np.ndarray:
+    """Sum square blocks so each output cell covers BASE_RESOLUTION / resolution input cells"""
+    factor = raster.shape[0] // resolution
+    return raster.reshape(resolution, factor, resolution, factor).sum(axis=(1, 3))
+
+def _gaussian_matrix(size: int, sigma: float) -> np.ndarray:
+    offsets = np.arange(size)[:, None] - np.arange(size)[None, :]
+    weights = np.exp(-0.5 * (offsets / sigma) ** 2)
+    weights[np.abs(offsets) > 3 * sigma] = 0
+    # Renormalize rows so mass near the edges is not lost
+    return (weights / weights.sum(axis=1, keepdims=True)).astype(np.float32)
+
+def smooth(raster: np.ndarray, sigma: float) -> np.ndarray:
+    """Separable Gaussian blur with sigma in cells, as two matrix products"""
+    if sigma <= 0:
+        return raster
+    kernel = _gaussian_matrix(raster.shape[0], sigma)
+    return kernel @ raster @ kernel.T
+
+def _palette() -> bytes:
+    # Black through red and yellow to white, 256 entries
+    anchors = np.array([[0, 0, 0], [120, 0, 40], [220, 40, 0], [255, 200, 0], [255, 255, 255]], dtype=np.float64)
+    positions = np.linspace(0, 255, len(anchors))
+    levels = np.arange(256)
+    colors = np.stack([np.interp(levels, positions, anchors[:, channel]) for channel in range(3)], axis=1)
+    return colors.round().astype(np.uint8).tobytes()
+
+PALETTE = _palette()
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+def encode_png(raster: np.ndarray) -> bytes:
+    """Indexed-colour PNG, scaled so the hottest cell maps to the last palette entry"""
+    height, width = raster.shape
+    peak = float(raster.max())
+    indices = np.zeros((height, width), dtype=np.uint8) if peak <= 0 else np.rint(raster * (255 / peak)).astype(np.uint8)
+    # Filter type 0 (none) byte at the start of every scanline
+    scanlines = np.hstack([np.zeros((height, 1), dtype=np.uint8), indices]).tobytes()
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+        + _png_chunk(b"PLTE", PALETTE)
+        + _png_chunk(b"IDAT", zlib.compress(scanlines, 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+def _floor_slot(moment: datetime) -> datetime:
+    seconds = SLOT_MINUTES * 60
+    return datetime.fromtimestamp(int(moment.timestamp() // seconds * seconds), tz=timezone.utc)
+
+class RasterStore:
+    """Per-section slot histograms for the last MAX_WINDOW_MINUTES, extended as slots close"""
+
+    def __init__(self):
+        self.slots: Dict[datetime, Dict[str, np.ndarray]] = {}
+        self.closed_until: Optional[datetime] = None
+        # Every heatmap row with a lower ingest_xid is binned (see rollups.py)
+        self.last_xid = None
+        # Bumped whenever what window() returns changes; part of the render cache key
+        self.version = 0
+        self._stats = {'slots_closed': 0, 'points_binned': 0, 'late_points': 0}
+        # Concurrent advances would bin the same rows twice
+        self._lock = asyncio.Lock()
+
+    async def advance(self, now: Optional[datetime] = None):
+        """Bin rows committed since the last call, close finished slots, drop slots past the max window"""
+        now = now or datetime.now(timezone.utc)
+        end = _floor_slot(now - timedelta(seconds=GRACE_SECONDS))
+        earliest = end - timedelta(minutes=MAX_WINDOW_MINUTES)
+        async with self._lock:
+            async with adb.get_cursor() as cur:
+                await cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot()) AS horizon")
+                horizon = (await cur.fetchone())['horizon']
+                if self.last_xid is None:
+                    where = "(h.ingest_xid IS NULL OR h.ingest_xid < %(horizon)s)"
+                else:
+                    where = "h.ingest_xid >= %(last_xid)s AND h.ingest_xid < %(horizon)s"
+                await cur.execute(POINTS_SQL.format(where=where), {
+                    'slot': SLOT_MINUTES * 60, 'start': earliest, 'last_xid': self.last_xid, 'horizon': horizon,
+                })
+                rows = await cur.fetchall()
+            changed = end != self.closed_until
+            for row in rows:
+                counts = histogram(row['xs'], row['ys'])
+                sections = self.slots.setdefault(row['slot'], {})
+                if row['section'] in sections:
+                    sections[row['section']] += counts
+                else:
+                    sections[row['section']] = counts
+                self._stats['points_binned'] += len(row['xs'])
+                if self.closed_until is not None and row['slot'] < self.closed_until:
+                    # Committed after its slot was already shown
+                    self._stats['late_points'] += len(row['xs'])
+                    changed = True
+            if self.closed_until is not None and end > self.closed_until:
+                self._stats['slots_closed'] += int((end - self.closed_until) / timedelta(minutes=SLOT_MINUTES))
+            for slot in [slot for slot in self.slots if slot < earliest]:
+                del self.slots[slot]
+            self.closed_until, self.last_xid = end, horizon
+            if changed:
+                self.version += 1
+
+    def window(self, section: str, minutes: int) -> Tuple[np.ndarray, datetime, datetime]:
+        """Base-resolution raster of section over the last minutes of closed slots"""
+        end = self.closed_until
+        start = end - timedelta(minutes=minutes)
+        raster = np.zeros((BASE_RESOLUTION, BASE_RESOLUTION), dtype=np.float32)
+        for slot, sections in self.slots.items():
+            if start <= slot < end and section in sections:
+                raster += sections[section]
+        return raster, start, end
+
+    def stats(self):
+        grids = sum(len(sections) for sections in self.slots.values())
+        return dict(self._stats, slots=len(self.slots), grids=grids,
+                    memory_kb=grids * BASE_RESOLUTION * BASE_RESOLUTION * 4 // 1024,
+                    closed_until=self.closed_until, version=self.version, cache=raster_cache.stats())
+
+store = RasterStore()
+
+@raster_cache.cached("heatmap.raster", ttl=SLOT_MINUTES * 60)
+async def _render(section: str, minutes: int, resolution: int, sigma: float, fmt: str,
+                  version: int) -> Tuple[bytes, Dict[str, str]]:
+    # version is part of the cache key, so entries go stale as soon as a slot closes or late rows land
+    raster, start, end = store.window(section, minutes)
+    points = int(raster.sum())
+    raster = smooth(downsample(raster, resolution), sigma)
+    if fmt == "png":
+        body, dtype = encode_png(raster), "uint8-indexed"
+    else:
+        body, dtype = raster.astype('<f4').tobytes(), "float32-le"
+    return body, {
+        "X-Raster-Width": str(resolution),
+        "X-Raster-Height": str(resolution),
+        "X-Raster-Dtype": dtype,
+        "X-Raster-Max": f"{float(raster.max()):.4f}",
+        "X-Raster-Points": str(points),
+        "X-Window-Start": start.isoformat(),
+        "X-Window-End": end.isoformat(),
+    }
+
+async def render(section: str, minutes: int, resolution: int, sigma: float = 0, fmt: str = "png"):
+    """Encoded raster and metadata headers for section over the last minutes"""
+    if store.closed_until is None or not raster_task.stats()['running']:
+        # No background task in this process: bin new rows on demand
+        await store.advance()
+    sigma = round(sigma / SIGMA_STEP) * SIGMA_STEP
+    return await _render(section, minutes, resolution, sigma, fmt, store.version)
+
+raster_task = PeriodicTask("heatmap_raster", store.advance, float(os.getenv('RASTER_REFRESH_INTERVAL', 30)))
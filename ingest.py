@@ -0,0 +1,198 @@
+"""Bulk write path for computer-vision events.
+
+Batches are written with a single COPY per table inside one transaction.
+Single events go through WriteBehindBuffer, which merges them into
+periodic COPY batches.
+"""
+import asyncio
+import inspect
+import os
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Sequence
+from psycopg.types.json import Jsonb
+from models import VisitorCreate, CashierCreate, HeatmapCreate, PredictionCreate
+from async_database import adb
+
+TABLE_MODELS = {
+    'visitors': VisitorCreate,
+    'cashier': CashierCreate,
+    'heatmap': HeatmapCreate,
+    'predictions': PredictionCreate,
+}
+
+TABLE_COLUMNS = {
+    'visitors': ('timestamp', 'section', 'count', 'gender_distribution'),
+    'cashier': ('timestamp', 'queue_length', 'wait_time_minutes', 'transactions_count', 'status'),
+    'heatmap': ('timestamp', 'section', 'density_level', 'coordinates', 'visitor_count'),
+    'predictions': ('metric_type', 'predicted_value', 'confidence_level', 'forecast_horizon'),
+}
+
+JSON_COLUMNS = {'gender_distribution', 'coordinates'}
+
+class BufferFullError(Exception):
+    """Raised when the write-behind buffer stays full past the put timeout"""
+
+_write_listeners: List[Callable] = []
+
+def add_write_listener(listener: Callable):
+    """Register listener(table, rows), called after every committed batch"""
+    _write_listeners.append(listener)
+
+async def _notify_listeners(table: str, rows: List[Dict[str, Any]]):
+    for listener in _write_listeners:
+        try:
+            result = listener(table, rows)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"Write listener {listener!r} failed: {e}")
+
+def _to_row(table: str, record) -> Dict[str, Any]:
+    row = record.model_dump()
+    if 'timestamp' in TABLE_COLUMNS[table] and row.get('timestamp') is None:
+        row['timestamp'] = datetime.now(timezone.utc)
+    return row
+
+async def write_batch(table: str, records: Sequence) -> int:
+    """COPY validated *Create records into table in one transaction"""
+    if not records:
+        return 0
+    columns = TABLE_COLUMNS[table]
+    rows = [_to_row(table, record) for record in records]
+    async with adb.get_connection() as conn:
+        async with conn.cursor() as cur:
+            async with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+                for row in rows:
+                    await copy.write_row([
+                        Jsonb(row[col]) if col in JSON_COLUMNS and row[col] is not None else row[col]
+                        for col in columns
+                    ])
+    await _notify_listeners(table, rows)
+    return len(rows)
+
+class WriteBehindBuffer:
+    """Bounded queue of single events flushed to the database in batches"""
+
+    def __init__(self, max_size=None, batch_size=None, flush_interval=None, put_timeout=None, max_retries=3,
+                 retry_backoff=None, max_retry_backoff=None):
+        self.max_size = max_size or int(os.getenv('INGEST_BUFFER_SIZE', 50000))
+        self.batch_size = batch_size or int(os.getenv('INGEST_BATCH_SIZE', 5000))
+        self.flush_interval = flush_interval or float(os.getenv('INGEST_FLUSH_INTERVAL', 0.5))
+        # How long a producer waits for room before being told to back off
+        self.put_timeout = put_timeout if put_timeout is not None else float(os.getenv('INGEST_PUT_TIMEOUT', 1))
+        self.max_retries = max_retries
+        # Failed flushes wait retry_backoff, doubling per attempt up to max_retry_backoff
+        self.retry_backoff = retry_backoff or float(os.getenv('INGEST_RETRY_BACKOFF', 1))
+        self.max_retry_backoff = max_retry_backoff or float(os.getenv('INGEST_RETRY_MAX_BACKOFF', 30))
+        self._queue = None
+        self._space = asyncio.Event()
+        self._retry_at = 0.0
+        self._task = None
+        self._closing = False
+        self._retry: Dict[str, List] = {}
+        self._attempts: Dict[str, int] = {}
+        self._stats = {'enqueued': 0, 'flushed': 0, 'batches': 0, 'rejected': 0, 'failed_batches': 0, 'dropped': 0}
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still buffered, then stop the flusher"""
+        if self._task is None:
+            return
+        self._closing = True
+        await self._task
+        self._task = None
+
+    async def put(self, table: str, record):
+        await self.put_many(table, [record])
+
+    async def put_many(self, table: str, records: Sequence):
+        """Queue all records or none: waits up to put_timeout for room for the whole batch"""
+        if self._task is None or self._closing:
+            raise BufferFullError("Ingest buffer is not running")
+        if len(records) > self.max_size:
+            raise ValueError(f"Batch of {len(records)} events exceeds the buffer size ({self.max_size})")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.put_timeout
+        while self._queue.maxsize - self._queue.qsize() < len(records):
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                self._stats['rejected'] += len(records)
+                raise BufferFullError(f"Ingest buffer full ({self.max_size} events)")
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        # No await between the check and the puts, so the room cannot be taken meanwhile
+        for record in records:
+            self._queue.put_nowait((table, record))
+        self._stats['enqueued'] += len(records)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch = []
+        while len(batch) < self.batch_size:
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0 or (self._closing and not batch):
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self._queue.get_nowait())
+            self._space.set()
+        return batch
+
+    async def _flush(self, batch):
+        by_table: Dict[str, List] = self._retry
+        self._retry = {}
+        for table, record in batch:
+            by_table.setdefault(table, []).append(record)
+        for table, records in by_table.items():
+            try:
+                await write_batch(table, records)
+                self._stats['flushed'] += len(records)
+                self._stats['batches'] += 1
+                self._attempts.pop(table, None)
+            except Exception as e:
+                self._stats['failed_batches'] += 1
+                attempts = self._attempts.get(table, 0) + 1
+                if attempts >= self.max_retries:
+                    print(f"Dropping {len(records)} buffered {table} events after {attempts} failed flushes: {e}")
+                    self._stats['dropped'] += len(records)
+                    self._attempts.pop(table, None)
+                else:
+                    backoff = min(self.retry_backoff * 2 ** (attempts - 1), self.max_retry_backoff)
+                    print(f"Flushing {len(records)} buffered {table} events failed, retrying in {backoff:.1f}s: {e}")
+                    self._attempts[table] = attempts
+                    self._retry[table] = records
+                    self._retry_at = max(self._retry_at, asyncio.get_running_loop().time() + backoff)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._retry or not (self._closing and self._queue.empty()):
+            if self._retry and loop.time() < self._retry_at:
+                # Stop draining while backing off: the queue fills up and producers get
+                # BufferFullError instead of events piling up in memory
+                await asyncio.sleep(self._retry_at - loop.time())
+                continue
+            batch = await self._collect()
+            if batch or self._retry:
+                await self._flush(batch)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['depth'] = self._queue.qsize() if self._queue else 0
+        stats['pending_retry'] = sum(len(records) for records in self._retry.values())
+        return stats
+
+# Global write-behind buffer, started with the app
+write_buffer = WriteBehindBuffer()
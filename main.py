@@ -6,7 +6,20 @@ import uvicorn
 import os
 
 from database import test_connection, db
-from routers import visitors, cashier, heatmap, predictions
+from async_database import adb
+from async_crud import AnalyticsCRUD
+from ingest import write_buffer
+import rollups
+import schema
+import heatmap_raster
+import health
+import forecasting
+import wait_time
+from cache import cache
+from coalesce import single_flight
+from pubsub import broker
+from serialization import FastJSONResponse
+from routers import visitors, cashier, heatmap, predictions, ingest, stream, chat, timeseries
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -14,7 +27,8 @@ app = FastAPI(
     description="Backend for Retail Analytics System with Computer Vision",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware
@@ -24,6 +38,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browsers hide response headers from other origins unless they are listed here
+    expose_headers=[
+        "X-Next-Cursor", "X-Data-Tier", "X-Session-Id", "X-Window-Start", "X-Window-End",
+        "X-Raster-Width", "X-Raster-Height", "X-Raster-Dtype", "X-Raster-Max", "X-Raster-Points", "Retry-After",
+    ],
 )
 
 # Include routers
@@ -31,6 +50,10 @@ app.include_router(visitors.router)
 app.include_router(cashier.router)
 app.include_router(heatmap.router)
 app.include_router(predictions.router)
+app.include_router(ingest.router)
+app.include_router(stream.router)
+app.include_router(chat.router)
+app.include_router(timeseries.router)
 
 # Custom exception handler
 @app.exception_handler(Exception)
@@ -47,12 +70,40 @@ async def startup_event():
     print("🚀 Retail Analytics Backend Starting Up...")
     print("=" * 50)
     
+    await adb.open()
+    write_buffer.start()
+
     # Test database connection
     if test_connection():
         print("✅ All systems operational!")
     else:
         print("⚠️  Warning: Database connection issues detected")
 
+    # Tables, partitions, indexes, rollup tables and heatmap_latest; failures are logged
+    await schema.ensure()
+    schema.maintenance_task.start()
+    rollups.rollup_task.start()
+    health.stats_task.start()
+    forecasting.forecast_task.start()
+    wait_time.wait_time_task.start()
+    heatmap_raster.raster_task.start()
+    await broker.start()
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush buffered events while the pool is still open
+    await write_buffer.stop()
+    await rollups.rollup_task.stop()
+    await schema.maintenance_task.stop()
+    await health.stats_task.stop()
+    await forecasting.forecast_task.stop()
+    await wait_time.wait_time_task.stop()
+    await heatmap_raster.raster_task.stop()
+    await broker.stop()
+    await adb.close()
+    db.close()
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -65,49 +116,85 @@ async def root():
             "cashier": "/api/cashier",
             "heatmap": "/api/heatmap",
             "predictions": "/api/predictions",
+            "ingest": "/api/ingest",
+            "stream": "/api/stream",
+            "chat": "/api/chat",
+            "timeseries": "/api/timeseries",
             "documentation": "/docs"
         }
     }
 
+@app.get("/api/data-version")
+async def data_version():
+    """Newest visitor and cashier inserting transactions, read without the cache"""
+    return FastJSONResponse(await AnalyticsCRUD.get_data_version())
+
+@app.get("/livez")
+async def liveness():
+    """Liveness probe: the process is serving requests; never touches the database"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness():
+    """Readiness probe: the connection pool can hand out a connection"""
+    if await adb.is_ready(timeout=float(os.getenv("READY_TIMEOUT", 1))):
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "not ready", "database_pool": adb.pool_stats()})
+
 @app.get("/health")
 async def health_check():
-    """Comprehensive health check"""
-    try:
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                # Check all tables exist
-                cur.execute("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                    AND table_name IN ('visitors', 'cashier', 'heatmap', 'predictions')
-                """)
-                tables = cur.fetchall()
-                
-                # Get row counts
-                cur.execute("SELECT COUNT(*) as count FROM visitors")
-                visitors_count = cur.fetchone()['count']
-                
-                cur.execute("SELECT COUNT(*) as count FROM cashier")
-                cashier_count = cur.fetchone()['count']
-                
-                return {
-                    "status": "healthy",
-                    "database": "connected",
-                    "tables_available": [t['table_name'] for t in tables],
-                    "data_summary": {
-                        "visitors_records": visitors_count,
-                        "cashier_records": cashier_count
-                    },
-                    "timestamp": datetime.now().isoformat()
-                }
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "database": "disconnected",
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }
+    """Health summary from the last background diagnostics snapshot"""
+    diagnostics = health.snapshot()
+    tables = diagnostics['tables']
+    response = {
+        "status": diagnostics['status'],
+        "database": "connected" if diagnostics['status'] == "healthy" else "disconnected",
+        "tables_available": list(tables),
+        "data_summary": {
+            "visitors_records": tables.get('visitors', {}).get('estimated_rows'),
+            "cashier_records": tables.get('cashier', {}).get('estimated_rows')
+        },
+        "checked_at": diagnostics['refreshed_at'],
+        "timestamp": datetime.now().isoformat()
+    }
+    if diagnostics['error']:
+        response["error"] = diagnostics['error']
+    return response
+
+@app.get("/health/diagnostics")
+async def diagnostics():
+    """Detailed cached diagnostics: table estimates and sizes, pools and background tasks"""
+    return {
+        **health.snapshot(),
+        "database_pool": db.pool_stats(),
+        "async_database_pool": adb.pool_stats(),
+        "background_tasks": {
+            "health": health.stats_task.stats(),
+            "rollups": rollups.rollup_task.stats(),
+            "forecasting": forecasting.forecast_task.stats(),
+            "wait_time": wait_time.wait_time_task.stats(),
+            "heatmap_raster": heatmap_raster.raster_task.stats(),
+            "schema": schema.maintenance_task.stats(),
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters for connection pools and background workers"""
+    return {
+        "database_pool": db.pool_stats(),
+        "async_database_pool": adb.pool_stats(),
+        "ingest_buffer": write_buffer.stats(),
+        "rollups": rollups.rollup_task.stats(),
+        "forecasting": forecasting.forecast_task.stats(),
+        "wait_time": dict(wait_time.wait_time_task.stats(), estimator=wait_time.estimator.stats()),
+        "heatmap_raster": dict(heatmap_raster.raster_task.stats(), store=heatmap_raster.store.stats()),
+        "cache": cache.stats(),
+        "coalescing": single_flight.stats(),
+        "push": broker.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
 
 # Run the application
 if __name__ == "__main__":
@@ -9,7 +9,7 @@ class VisitorBase(BaseModel):
     gender_distribution: Optional[Dict[str, int]] = None
 
 class VisitorCreate(VisitorBase):
-    pass
+    timestamp: Optional[datetime] = None  # detection time; defaults to receipt time
 
 class Visitor(VisitorBase):
     id: int
@@ -26,7 +26,7 @@ class CashierBase(BaseModel):
     status: str = Field(..., pattern="^(busy|normal|idle)$")
 
 class CashierCreate(CashierBase):
-    pass
+    timestamp: Optional[datetime] = None  # detection time; defaults to receipt time
 
 class Cashier(CashierBase):
     id: int
@@ -43,7 +43,7 @@ class HeatmapBase(BaseModel):
     visitor_count: int
 
 class HeatmapCreate(HeatmapBase):
-    pass
+    timestamp: Optional[datetime] = None  # detection time; defaults to receipt time
 
 class Heatmap(HeatmapBase):
     id: int
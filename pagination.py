@@ -0,0 +1,27 @@
+"""Opaque keyset cursors over (timestamp, id)"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Turn a token from encode_cursor back into its key; raises ValueError if malformed"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid pagination cursor") from e
+
+def next_cursor(rows, limit: Optional[int]) -> Optional[str]:
+    """Cursor for the page after rows, or None when rows was the last page"""
+    if not limit or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(last['timestamp'], last['id'])
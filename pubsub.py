@@ -0,0 +1,155 @@
+"""Real-time update fan-out.
+
+Writers announce new data with pg_notify on PUSH_CHANNEL. Each API process
+holds one LISTEN connection and fans every notification out to its local
+subscribers. Every subscriber has a bounded queue that drops its oldest
+message when full, so a slow client never holds up the others.
+
+Topics are "visitors", "cashier", "heatmap" and "predictions". Visitor and
+heatmap updates are published per section as "visitors:<section>" and
+"heatmap:<section>". Subscribing to "visitors" receives every section.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Dict, Iterable, List, Set
+import psycopg
+from async_database import adb
+from ingest import add_write_listener
+from serialization import dumps_text
+
+CHANNEL = os.getenv('PUSH_CHANNEL', 'retail_updates')
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv('PUSH_QUEUE_SIZE', 100))
+TOPICS = ('visitors', 'cashier', 'heatmap', 'predictions')
+
+class Subscription:
+    def __init__(self, topics: Iterable[str], maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.topics: Set[str] = set(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def wants(self, topic: str) -> bool:
+        return topic in self.topics or topic.split(':', 1)[0] in self.topics
+
+    def offer(self, message: Dict[str, Any]):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: float = None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+class Broker:
+    def __init__(self, channel: str = CHANNEL):
+        self.channel = channel
+        self._subscriptions: Set[Subscription] = set()
+        self._listener = None
+        self._stats = {'notifications': 0, 'delivered': 0, 'reconnects': 0}
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        subscription = Subscription(topics)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, topic: str, data: Any):
+        """Deliver to local subscribers without waiting on any of them"""
+        message = {'topic': topic, 'data': data}
+        for subscription in list(self._subscriptions):
+            if subscription.wants(topic):
+                subscription.offer(message)
+                self._stats['delivered'] += 1
+
+    async def start(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        backoff = 1
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(
+                    adb.connection_string, sslmode=adb.sslmode, autocommit=True
+                )
+                async with conn:
+                    await conn.execute(f"LISTEN {self.channel}")
+                    backoff = 1
+                    async for notification in conn.notifies():
+                        self._stats['notifications'] += 1
+                        try:
+                            message = json.loads(notification.payload)
+                            self.publish(message['topic'], message['data'])
+                        except (ValueError, KeyError) as e:
+                            print(f"Ignoring malformed notification: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Push listener disconnected, retrying in {backoff}s: {e}")
+                self._stats['reconnects'] += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def stats(self):
+        return dict(
+            self._stats,
+            subscribers=len(self._subscriptions),
+            dropped=sum(subscription.dropped for subscription in self._subscriptions),
+            listening=self._listener is not None and not self._listener.done(),
+        )
+
+def _latest_per_section(rows: List[Dict[str, Any]], fields: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    latest = {}
+    for row in rows:
+        current = latest.get(row['section'])
+        if current is None or row['timestamp'] >= current['timestamp']:
+            latest[row['section']] = row
+    return {section: {field: row[field] for field in fields} for section, row in latest.items()}
+
+def summarize_write(table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Compact per-topic messages for a committed batch; stays under NOTIFY's 8 kB payload limit"""
+    if table == 'visitors':
+        latest = _latest_per_section(rows, ('section', 'count', 'timestamp'))
+        return [{'topic': f"visitors:{section}", 'data': data} for section, data in latest.items()]
+    if table == 'heatmap':
+        latest = _latest_per_section(rows, ('section', 'density_level', 'visitor_count', 'timestamp'))
+        return [{'topic': f"heatmap:{section}", 'data': data} for section, data in latest.items()]
+    if table == 'cashier':
+        row = max(rows, key=lambda r: r['timestamp'])
+        fields = ('queue_length', 'wait_time_minutes', 'transactions_count', 'status', 'timestamp')
+        return [{'topic': 'cashier', 'data': {field: row[field] for field in fields}}]
+    if table == 'predictions':
+        return [{'topic': 'predictions', 'data': {'count': len(rows)}}]
+    return []
+
+async def notify_write(table: str, rows: List[Dict[str, Any]]):
+    messages = summarize_write(table, rows)
+    if not messages:
+        return
+    payloads = [dumps_text(message) for message in messages]
+    try:
+        async with adb.get_cursor() as cur:
+            await cur.execute(
+                "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                (broker.channel, payloads)
+            )
+    except Exception as e:
+        # Without NOTIFY at least this process's subscribers hear about it
+        print(f"pg_notify failed, publishing locally only: {e}")
+        for message in messages:
+            broker.publish(message['topic'], message['data'])
+
+# Global broker, one LISTEN connection per process
+broker = Broker()
+add_write_listener(notify_write)
@@ -0,0 +1,103 @@
+"""Tiered retention for raw telemetry and its rollups.
+
+Data ages through tiers: raw rows, then minute, 5-minute and hourly rollup
+buckets. RETENTION_<TABLE> sets how many days each tier keeps, e.g.
+RETENTION_VISITORS="raw=14,minute=2,5min=90,hour=0" (0 keeps forever); by
+default every tier keeps everything, so nothing is deleted until a policy
+is set. Raw
+rows of partitioned tables go with whole partitions (see schema.py). Rows
+of unpartitioned tables and old rollup buckets are deleted in small batches,
+each in its own short transaction, so readers and the rollup job are never
+blocked for long. Readers use choose_tier to find the coarsest tier that
+still serves a window at the requested resolution.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+from async_database import adb
+from rollups import FOLD_SQL, GRANULARITIES, folded
+
+# Seconds per point of each tier, finest first
+TIERS = {'raw': 0, 'minute': 60, '5min': 300, 'hour': 3600}
+TABLES = ('visitors', 'cashier', 'heatmap')
+ROLLUP_PREFIX = {'visitors': 'visitor', 'cashier': 'cashier'}
+DEFAULT_POLICY = "raw=0,minute=0,5min=0,hour=0"
+DELETE_BATCH_ROWS = int(os.getenv('RETENTION_BATCH_ROWS', 5000))
+
+def parse_policy(text: str) -> Dict[str, int]:
+    """"raw=14,5min=90" -> days per tier; tiers left out keep the default"""
+    policy = dict(item.split("=") for item in DEFAULT_POLICY.split(","))
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        tier, _, days = item.partition("=")
+        if tier not in TIERS or not days.isdigit():
+            raise ValueError(f"Bad retention entry {item!r}; expected <tier>=<days> with tier in {', '.join(TIERS)}")
+        policy[tier] = days
+    return {tier: int(days) for tier, days in policy.items()}
+
+POLICY = {table: parse_policy(os.getenv(f'RETENTION_{table.upper()}', DEFAULT_POLICY)) for table in TABLES}
+
+def cutoff(table: str, tier: str, now: datetime = None):
+    """Oldest timestamp still kept in a tier, or None if it keeps everything"""
+    days = POLICY[table][tier]
+    if not days:
+        return None
+    return (now or datetime.now(timezone.utc)) - timedelta(days=days)
+
+def choose_tier(table: str, start: datetime, end: datetime = None, resolution_seconds: int = 0) -> str:
+    """Coarsest tier at or finer than resolution_seconds that still reaches back to start.
+
+    Tiers whose buckets are longer than the [start, end) window (end defaults to now) are
+    skipped: one bucket would span more than was asked for. If no such tier holds data
+    that old, the finest tier that does is used instead.
+    """
+    start, end = (moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+                  for moment in (start, end or datetime.now(timezone.utc)))
+    window = (end - start).total_seconds()
+    tiers = TIERS if table in ROLLUP_PREFIX else {'raw': 0}
+    covering = [tier for tier in tiers if cutoff(table, tier) is None or start >= cutoff(table, tier)]
+    fine_enough = [tier for tier in covering if TIERS[tier] <= min(resolution_seconds, window)]
+    if fine_enough:
+        return fine_enough[-1]
+    return covering[0] if covering else list(tiers)[-1]
+
+async def _delete_batches(statement: str, params: tuple) -> int:
+    """Run a LIMIT-ed delete until it removes less than a full batch"""
+    deleted = 0
+    while True:
+        async with adb.get_cursor() as cur:
+            await cur.execute(statement, params + (DELETE_BATCH_ROWS,))
+            count = cur.rowcount
+        deleted += count
+        if count < DELETE_BATCH_ROWS:
+            return deleted
+        # Let request handlers run between batches
+        await asyncio.sleep(0)
+
+async def delete_raw(table: str, before: datetime) -> int:
+    """Batched delete of raw rows older than before, for tables that are not partitioned"""
+    guard = ""
+    if table in FOLD_SQL:
+        # Never delete rows the rollups have not folded in yet
+        guard = f"AND {folded(table)}"
+    return await _delete_batches(f"""
+        DELETE FROM {table} WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM {table} WHERE timestamp < %s {guard} LIMIT %s
+        ))
+    """, (before,))
+
+async def trim_rollups() -> Dict[str, int]:
+    """Delete rollup buckets past each tier's retention; returns rows deleted per table"""
+    deleted = {}
+    for table, prefix in ROLLUP_PREFIX.items():
+        for granularity in GRANULARITIES:
+            before = cutoff(table, granularity)
+            if before is None:
+                continue
+            name = f"{prefix}_rollup_{granularity}"
+            deleted[name] = await _delete_batches(f"""
+                DELETE FROM {name} WHERE ctid = ANY(ARRAY(
+                    SELECT ctid FROM {name} WHERE bucket < %s LIMIT %s
+                ))
+            """, (before,))
+    return deleted
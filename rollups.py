@@ -0,0 +1,259 @@
+"""Incremental per-minute, per-5-minute and per-hour aggregates of visitors and cashier rows.
+
+Raw rows carry ingest_xid, the id of the transaction that inserted them.
+rollup_state holds a watermark per source, last_xid: every row with a lower
+ingest_xid is already folded in. A background job folds the rows between the
+watermark and the oldest transaction still running
+(pg_snapshot_xmin(pg_current_snapshot())), and advances the watermark in
+the same transaction. Every transaction below that horizon has finished, so
+no row can commit into a range that was already folded. Ids carry no such
+guarantee, because concurrent COPY batches commit out of id order. Rollups
+never double count or miss rows, and work per run is proportional to new
+data. Readers combine the rollups with the raw rows at or above the
+watermark (see pending()) to stay exact. A long-running transaction holds
+the horizon back; readers then fall back on more raw rows but stay exact.
+
+Rows from before ingest_xid existed have it NULL and are folded by id up to
+last_id. Upgrading adds the column in its own short transaction, then folds
+the legacy rows in id batches; last_xid stays NULL until that is done.
+Meanwhile readers count every row that has an ingest_xid as pending, and
+only legacy rows above last_id are briefly missing.
+"""
+import inspect
+import os
+from typing import Callable, List
+from async_database import adb
+from background import PeriodicTask
+
+# bucket expression per rollup granularity
+GRANULARITIES = {
+    'minute': "date_trunc('minute', timestamp)",
+    '5min': "to_timestamp(floor(extract(epoch FROM timestamp) / 300) * 300)",
+    'hour': "date_trunc('hour', timestamp)",
+}
+
+ROLLUP_INTERVAL = float(os.getenv('ROLLUP_INTERVAL', 10))
+# Raw rows folded per transaction, to keep locks short; a single insert transaction is never split
+ROLLUP_BATCH_ROWS = int(os.getenv('ROLLUP_BATCH_ROWS', 200000))
+# Adding ingest_xid to a raw table gives up rather than queue behind long transactions
+MIGRATE_LOCK_TIMEOUT = os.getenv('ROLLUP_MIGRATE_LOCK_TIMEOUT', '5s')
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        source TEXT PRIMARY KEY,
+        last_id BIGINT NOT NULL DEFAULT 0,
+        last_xid xid8,
+        updated_at TIMESTAMPTZ
+    )
+    """,
+    "ALTER TABLE rollup_state ADD COLUMN IF NOT EXISTS last_xid xid8",
+    "INSERT INTO rollup_state (source) VALUES ('visitors'), ('cashier') ON CONFLICT DO NOTHING",
+] + [
+    f"""
+    CREATE TABLE IF NOT EXISTS visitor_rollup_{granularity} (
+        bucket TIMESTAMPTZ NOT NULL,
+        section TEXT NOT NULL,
+        total_visitors BIGINT NOT NULL,
+        records_count BIGINT NOT NULL,
+        PRIMARY KEY (bucket, section)
+    )
+    """ for granularity in GRANULARITIES
+] + [
+    f"""
+    CREATE TABLE IF NOT EXISTS cashier_rollup_{granularity} (
+        bucket TIMESTAMPTZ PRIMARY KEY,
+        queue_sum BIGINT NOT NULL,
+        queue_max INTEGER NOT NULL,
+        wait_sum DOUBLE PRECISION NOT NULL,
+        wait_count BIGINT NOT NULL,
+        records_count BIGINT NOT NULL
+    )
+    """ for granularity in GRANULARITIES
+]
+
+FOLD_SQL = {
+    'visitors': """
+        INSERT INTO visitor_rollup_{granularity} AS r (bucket, section, total_visitors, records_count)
+        SELECT {bucket}, section, SUM(count), COUNT(*)
+        FROM visitors
+        WHERE {where}
+        GROUP BY 1, 2
+        ON CONFLICT (bucket, section) DO UPDATE SET
+            total_visitors = r.total_visitors + EXCLUDED.total_visitors,
+            records_count = r.records_count + EXCLUDED.records_count
+    """,
+    'cashier': """
+        INSERT INTO cashier_rollup_{granularity} AS r
+            (bucket, queue_sum, queue_max, wait_sum, wait_count, records_count)
+        SELECT {bucket}, SUM(queue_length), MAX(queue_length),
+               COALESCE(SUM(wait_time_minutes), 0), COUNT(wait_time_minutes), COUNT(*)
+        FROM cashier
+        WHERE {where}
+        GROUP BY 1
+        ON CONFLICT (bucket) DO UPDATE SET
+            queue_sum = r.queue_sum + EXCLUDED.queue_sum,
+            queue_max = GREATEST(r.queue_max, EXCLUDED.queue_max),
+            wait_sum = r.wait_sum + EXCLUDED.wait_sum,
+            wait_count = r.wait_count + EXCLUDED.wait_count,
+            records_count = r.records_count + EXCLUDED.records_count
+    """,
+}
+
+# A tier added to an existing deployment starts from the finer minute tier,
+# which holds everything already folded; runs only while the new table is empty
+SEED_5MIN_SQL = {
+    'visitors': """
+        INSERT INTO visitor_rollup_5min (bucket, section, total_visitors, records_count)
+        SELECT to_timestamp(floor(extract(epoch FROM bucket) / 300) * 300), section,
+               SUM(total_visitors), SUM(records_count)
+        FROM visitor_rollup_minute
+        WHERE NOT EXISTS (SELECT 1 FROM visitor_rollup_5min)
+        GROUP BY 1, 2
+    """,
+    'cashier': """
+        INSERT INTO cashier_rollup_5min (bucket, queue_sum, queue_max, wait_sum, wait_count, records_count)
+        SELECT to_timestamp(floor(extract(epoch FROM bucket) / 300) * 300),
+               SUM(queue_sum), MAX(queue_max), SUM(wait_sum), SUM(wait_count), SUM(records_count)
+        FROM cashier_rollup_minute
+        WHERE NOT EXISTS (SELECT 1 FROM cashier_rollup_5min)
+        GROUP BY 1
+    """,
+}
+
+_listeners: List[Callable] = []
+
+def add_rollup_listener(listener: Callable):
+    """Register listener(source) called after new raw rows were folded in"""
+    _listeners.append(listener)
+
+def pending(source: str) -> str:
+    """SQL condition matching raw rows of source not yet folded into the rollups"""
+    # Before the xid watermark starts (see _migrate) every row with an ingest_xid is pending
+    return f"ingest_xid >= (SELECT COALESCE(last_xid, '0'::xid8) FROM rollup_state WHERE source = '{source}')"
+
+def folded(source: str) -> str:
+    """SQL condition matching raw rows of source already counted by the rollups"""
+    state = f"FROM rollup_state WHERE source = '{source}'"
+    return f"((ingest_xid IS NULL AND id <= (SELECT last_id {state})) OR ingest_xid < (SELECT last_xid {state}))"
+
+async def _fold(cur, source: str, where: str, params: tuple):
+    for granularity, bucket in GRANULARITIES.items():
+        await cur.execute(FOLD_SQL[source].format(granularity=granularity, bucket=bucket, where=where), params)
+
+async def add_xid_column(table: str):
+    """Add ingest_xid to an existing table in its own short transaction; the ALTER holds ACCESS EXCLUSIVE until commit"""
+    async with adb.get_cursor() as cur:
+        await cur.execute("""
+            SELECT 1 FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'ingest_xid' AND NOT attisdropped
+        """, (table,))
+        if await cur.fetchone() is not None:
+            return
+        await cur.execute("SELECT set_config('lock_timeout', %s, true)", (MIGRATE_LOCK_TIMEOUT,))
+        # Added without a default first so existing rows stay NULL (legacy) rather than
+        # all taking this transaction's xid
+        await cur.execute(f"ALTER TABLE {table} ADD COLUMN ingest_xid xid8")
+        await cur.execute(f"ALTER TABLE {table} ALTER COLUMN ingest_xid SET DEFAULT pg_current_xact_id()")
+
+async def _fold_legacy_batch(source: str) -> bool:
+    """Fold the next ROLLUP_BATCH_ROWS legacy rows above last_id; True once the xid watermark is set"""
+    async with adb.get_cursor() as cur:
+        # Same row lock as fold_batch
+        await cur.execute("SELECT last_id, last_xid FROM rollup_state WHERE source = %s FOR UPDATE", (source,))
+        state = await cur.fetchone()
+        if state['last_xid'] is not None:
+            return True
+        await cur.execute(f"""
+            SELECT id FROM {source} WHERE ingest_xid IS NULL AND id > %s ORDER BY id OFFSET %s LIMIT 1
+        """, (state['last_id'], ROLLUP_BATCH_ROWS))
+        row = await cur.fetchone()
+        if row is not None:
+            await _fold(cur, source, "ingest_xid IS NULL AND id > %s AND id < %s", (state['last_id'], row['id']))
+            await cur.execute("""
+                UPDATE rollup_state SET last_id = %s, updated_at = NOW() WHERE source = %s
+            """, (row['id'] - 1, source))
+            return False
+        # Last batch: fold the rest, then start the xid watermark below every row that has one
+        await cur.execute(f"SELECT MAX(id) AS max_id FROM {source} WHERE ingest_xid IS NULL AND id > %s",
+                          (state['last_id'],))
+        max_id = (await cur.fetchone())['max_id']
+        if max_id is not None:
+            await _fold(cur, source, "ingest_xid IS NULL AND id > %s AND id <= %s", (state['last_id'], max_id))
+        await cur.execute(f"""
+            UPDATE rollup_state SET
+                last_id = GREATEST(last_id, %s),
+                last_xid = LEAST(pg_snapshot_xmin(pg_current_snapshot()), (SELECT MIN(ingest_xid) FROM {source})),
+                updated_at = NOW()
+            WHERE source = %s
+        """, (max_id or 0, source))
+        return True
+
+async def ensure_tables():
+    async with adb.get_cursor() as cur:
+        for statement in SCHEMA:
+            await cur.execute(statement)
+    # Move each source from the old id watermark to the xid watermark, in short transactions
+    for source in FOLD_SQL:
+        await add_xid_column(source)
+        while not await _fold_legacy_batch(source):
+            pass
+    async with adb.get_cursor() as cur:
+        # Same lock as fold_batch, so no batch is folded while seeding
+        await cur.execute("SELECT source FROM rollup_state ORDER BY source FOR UPDATE")
+        for statement in SEED_5MIN_SQL.values():
+            await cur.execute(statement)
+
+async def fold_batch(source: str) -> int:
+    """Fold the next batch of committed raw rows of source; returns rows folded"""
+    async with adb.get_cursor() as cur:
+        # Row lock serialises workers so each raw row is counted exactly once
+        await cur.execute("""
+            SELECT last_xid, pg_snapshot_xmin(pg_current_snapshot()) AS horizon
+            FROM rollup_state WHERE source = %s FOR UPDATE
+        """, (source,))
+        state = await cur.fetchone()
+        last_xid, upto = state['last_xid'], state['horizon']
+        # Stop the batch at a transaction boundary once it holds ROLLUP_BATCH_ROWS rows
+        await cur.execute(f"""
+            SELECT ingest_xid FROM {source}
+            WHERE ingest_xid >= %s AND ingest_xid < %s
+            ORDER BY ingest_xid OFFSET %s LIMIT 1
+        """, (last_xid, upto, ROLLUP_BATCH_ROWS))
+        row = await cur.fetchone()
+        if row and row['ingest_xid'] != last_xid:
+            upto = row['ingest_xid']
+        elif row:
+            # One transaction wrote more than a batch; take all of it
+            await cur.execute(f"""
+                SELECT COALESCE(MIN(ingest_xid), %s::xid8) AS next_xid FROM {source}
+                WHERE ingest_xid > %s AND ingest_xid < %s
+            """, (upto, last_xid, upto))
+            upto = (await cur.fetchone())['next_xid']
+        await cur.execute(f"SELECT COUNT(*) AS rows FROM {source} WHERE ingest_xid >= %s AND ingest_xid < %s",
+                          (last_xid, upto))
+        rows = (await cur.fetchone())['rows']
+        if rows:
+            await _fold(cur, source, "ingest_xid >= %s AND ingest_xid < %s", (last_xid, upto))
+        # The watermark also moves past transactions that wrote nothing here
+        await cur.execute("""
+            UPDATE rollup_state SET last_xid = %s, updated_at = NOW()
+            WHERE source = %s AND last_xid < %s
+        """, (upto, source, upto))
+        return rows
+
+async def refresh():
+    """Fold all new rows of every source into the rollups"""
+    for source in FOLD_SQL:
+        total = 0
+        while True:
+            batch = await fold_batch(source)
+            if not batch:
+                break
+            total += batch
+        if total:
+            for listener in _listeners:
+                result = listener(source)
+                if inspect.isawaitable(result):
+                    await result
+
+rollup_task = PeriodicTask("rollups", refresh, ROLLUP_INTERVAL)
@@ -1,40 +1,60 @@
-from fastapi import APIRouter, Query
-from datetime import datetime
-from typing import List
+from fastapi import APIRouter, Query, HTTPException
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from models import Cashier
-from crud import CashierCRUD
+from async_crud import CashierCRUD
+from pagination import decode_cursor, next_cursor
+from retention import choose_tier
+from serialization import FastJSONResponse
+import wait_time
 
 router = APIRouter(prefix="/api/cashier", tags=["cashier"])
 
-@router.get("/current", response_model=dict)
+@router.get("/current")
 async def get_current_cashier_status():
     """Get current cashier queue status"""
-    status = CashierCRUD.get_current_status()
+    status = await CashierCRUD.get_current_status()
     if not status:
         return {"message": "No cashier data available", "timestamp": datetime.now()}
-    return status
+    return FastJSONResponse(status)
 
-@router.get("/history", response_model=List[dict])
-async def get_queue_history(hours: int = Query(6, ge=1, le=168)):
-    """Get queue history for specified hours"""
-    return CashierCRUD.get_queue_history(hours)
+@router.get("/history")
+async def get_queue_history(
+    hours: int = Query(6, ge=1, le=168),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    resolution: Optional[int] = Query(None, ge=0, description="Coarsest acceptable seconds per point")
+):
+    """Get queue history for specified hours, from raw rows or the coarsest rollup tier that fits.
 
-@router.get("/busy-periods", response_model=List[dict])
+    Raw rows can be paged one keyset page at a time.
+    """
+    now = datetime.now(timezone.utc)
+    tier = choose_tier("cashier", now - timedelta(hours=hours), now, resolution or 0)
+    headers = {"X-Data-Tier": tier}
+    if tier != "raw":
+        if limit is not None or cursor is not None:
+            raise HTTPException(status_code=400, detail=f"Paging is only available for raw rows, not the {tier} tier")
+        return FastJSONResponse(await CashierCRUD.get_bucketed_history(hours, tier), headers=headers)
+    try:
+        after = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = await CashierCRUD.get_queue_history(hours, limit=limit, after=after)
+    token = next_cursor(rows, limit)
+    if token:
+        headers["X-Next-Cursor"] = token
+    return FastJSONResponse(rows, headers=headers)
+
+@router.get("/busy-periods")
 async def get_busy_periods(threshold: int = Query(3, ge=1, le=20)):
     """Get periods when queue was busy"""
-    return CashierCRUD.get_busy_periods(threshold)
+    return FastJSONResponse(await CashierCRUD.get_busy_periods(threshold))
 
-@router.get("/wait-time", response_model=dict)
+@router.get("/wait-time")
 async def estimate_wait_time():
-    """Estimate current wait time based on queue"""
-    status = CashierCRUD.get_current_status()
-    if not status:
+    """Estimate current wait time from learned per-customer service times"""
+    estimate = await wait_time.current_estimate()
+    if not estimate:
         return {"estimated_wait_minutes": 0, "message": "No data"}
-    
-    # Simple estimation: 2 minutes per person in queue
-    wait_time = status['queue_length'] * 2
-    return {
-        "estimated_wait_minutes": wait_time,
-        "queue_length": status['queue_length'],
-        "timestamp": datetime.now()
-    }
\ No newline at end of file
+    return dict(estimate, timestamp=datetime.now())
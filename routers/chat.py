@@ -0,0 +1,174 @@
+import asyncio
+import os
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from serialization import dumps_text
+
+router = APIRouter(prefix="/api/chat", tags=["chat"])
+
+# LLM calls are slow and rate limited upstream; cap them, not the sessions
+MAX_CONCURRENT_LLM = int(os.getenv("CHAT_MAX_CONCURRENT_LLM", 8))
+_llm_slots = asyncio.Semaphore(MAX_CONCURRENT_LLM)
+# One turn at a time per session, so its memory sees turns in order
+_session_locks = weakref.WeakValueDictionary()
+_chatbot = None
+_stats = {'requests': 0, 'quick_answers': 0, 'agent_runs': 0, 'errors': 0, 'waiting_for_llm': 0}
+
+class ChatRequest(BaseModel):
+    message: str = Field(..., min_length=1, max_length=2000)
+    session_id: Optional[str] = None
+
+def _load_chatbot():
+    """Import the agent on first use, so the API runs without the LLM stack installed"""
+    global _chatbot
+    if _chatbot is None:
+        try:
+            import chatbot
+            import chatbot_tools
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Chatbot unavailable: {e}")
+        if isinstance(chatbot_tools.backend, chatbot_tools.DirectBackend):
+            # Tools run in worker threads and hand CRUD calls back to this loop
+            chatbot_tools.backend.bind_loop(asyncio.get_running_loop())
+        _chatbot = chatbot
+    return _chatbot
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _session_locks[session_id] = lock
+    return lock
+
+@asynccontextmanager
+async def _llm_slot():
+    """Hold one of the MAX_CONCURRENT_LLM slots; every LLM call, summaries included, goes through here"""
+    _stats['waiting_for_llm'] += 1
+    try:
+        await _llm_slots.acquire()
+    finally:
+        _stats['waiting_for_llm'] -= 1
+    try:
+        yield
+    finally:
+        _llm_slots.release()
+
+async def _summarize_if_due(session):
+    """Fold old turns into the session summary, in the threadpool and under an LLM slot"""
+    if await run_in_threadpool(session.over_budget):
+        async with _llm_slot():
+            await run_in_threadpool(session.summarize)
+
+async def _chat_events(bot, message: str, session_id: str):
+    """Yield (event, data) pairs for one turn: tool steps, tokens, then the final answer"""
+    _stats['requests'] += 1
+    yield "session", {"session_id": session_id}
+    async with _session_lock(session_id):
+        session = bot.sessions.get(session_id)
+        answer = await run_in_threadpool(bot.quick_answer, message, session)
+        if answer is not None:
+            _stats['quick_answers'] += 1
+            yield "final", {"answer": answer, "source": "fast"}
+            # Summarize after answering, so a fast answer never waits for an LLM slot
+            await _summarize_if_due(session)
+            return
+
+        # Only first turns are cached: later answers depend on this session's history
+        cacheable = not session.has_history
+        version_read_at = time.time()
+        version = await run_in_threadpool(bot.answer_cache.current_version) if cacheable else None
+        history = await run_in_threadpool(session.history)
+        prompt_tokens = await run_in_threadpool(bot.sessions.count_prompt_tokens, session, message)
+        bot.sessions.record_turn(session, prompt_tokens)
+        async with _llm_slot():
+            started = time.perf_counter()
+            answer = None
+            inputs = {"input": message, "chat_history": history}
+            async for event in bot.agent.astream_events(inputs, version="v1"):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    token = event["data"]["chunk"].content
+                    if token:
+                        yield "token", {"text": token}
+                elif kind == "on_tool_start":
+                    yield "tool_start", {"tool": event["name"], "input": event["data"].get("input")}
+                elif kind == "on_tool_end":
+                    yield "tool_end", {"tool": event["name"], "output": str(event["data"].get("output"))}
+                elif kind == "on_chain_end" and event["name"] == "AgentExecutor":
+                    answer = event["data"]["output"]["output"]
+        _stats['agent_runs'] += 1
+        bot.fast_path.record_agent(time.perf_counter() - started)
+        if answer is not None:
+            bot.answer_cache.put(message, answer, version, version_read_at)
+            session.remember(message, answer)
+        yield "final", {"answer": answer, "source": "agent"}
+        await _summarize_if_due(session)
+
+@router.post("")
+async def chat(request: ChatRequest):
+    """Answer a question as Server-Sent Events: session, tool_start/tool_end, token, final"""
+    bot = _load_chatbot()
+    session_id = request.session_id or uuid.uuid4().hex
+
+    async def events():
+        try:
+            async for event, data in _chat_events(bot, request.message, session_id):
+                yield f"event: {event}\ndata: {dumps_text(data)}\n\n"
+        except Exception as e:
+            _stats['errors'] += 1
+            print(f"Chat turn failed: {e}")
+            yield f"event: error\ndata: {dumps_text({'error': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-Id": session_id}
+    )
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket, session_id: Optional[str] = None):
+    """Conversational WebSocket; send {"message": ...}, receive {"event": ..., "data": ...} frames"""
+    await websocket.accept()
+    try:
+        bot = _load_chatbot()
+    except HTTPException as e:
+        await websocket.close(code=1011, reason=e.detail[:120])
+        return
+    session_id = session_id or uuid.uuid4().hex
+    try:
+        while True:
+            request = await websocket.receive_json()
+            message = str(request.get("message", "")).strip()
+            if not message:
+                await websocket.send_json({"event": "error", "data": {"error": "message is required"}})
+                continue
+            try:
+                async for event, data in _chat_events(bot, message, session_id):
+                    await websocket.send_text(dumps_text({"event": event, "data": data}))
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                _stats['errors'] += 1
+                print(f"Chat turn failed: {e}")
+                await websocket.send_json({"event": "error", "data": {"error": str(e)}})
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/stats")
+async def chat_stats():
+    """Chat throughput plus fast path, answer cache and session memory counters"""
+    stats = dict(_stats, max_concurrent_llm=MAX_CONCURRENT_LLM)
+    if _chatbot is not None:
+        stats.update(
+            fast_path=_chatbot.fast_path.stats(),
+            answer_cache=_chatbot.answer_cache.stats(),
+            memory=_chatbot.sessions.stats(),
+        )
+    return stats
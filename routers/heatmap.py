@@ -1,22 +1,36 @@
-from fastapi import APIRouter
-from typing import List
-from crud import HeatmapCRUD
+from fastapi import APIRouter, HTTPException, Path, Query, Response
+from serialization import FastJSONResponse
+from async_crud import HeatmapCRUD
+import heatmap_raster
 
 router = APIRouter(prefix="/api/heatmap", tags=["heatmap"])
 
-@router.get("/", response_model=List[dict])
+@router.get("/")
 async def get_latest_heatmap():
     """Get latest heatmap data for all sections"""
-    return HeatmapCRUD.get_latest()
+    return FastJSONResponse(await HeatmapCRUD.get_latest())
 
-@router.get("/analysis", response_model=dict)
+@router.get("/analysis")
 async def get_density_analysis():
     """Get heatmap density analysis"""
-    return HeatmapCRUD.get_density_analysis()
+    return FastJSONResponse(await HeatmapCRUD.get_density_analysis())
 
-@router.get("/density/{level}", response_model=List[dict])
-async def get_by_density_level(level: str):
+@router.get("/density/{level}")
+async def get_by_density_level(level: str = Path(..., pattern="^(high|medium|low)$")):
     """Get sections by density level (high/medium/low)"""
-    data = HeatmapCRUD.get_latest()
-    filtered = [item for item in data if item['density_level'] == level]
-    return filtered
\ No newline at end of file
+    return FastJSONResponse(await HeatmapCRUD.get_by_density(level))
+
+@router.get("/raster")
+async def get_heatmap_raster(
+    section: str,
+    minutes: int = Query(60, ge=heatmap_raster.SLOT_MINUTES, le=heatmap_raster.MAX_WINDOW_MINUTES),
+    resolution: int = Query(64),
+    sigma: float = Query(0, ge=0, le=8, description="Gaussian smoothing radius in cells"),
+    fmt: str = Query("png", alias="format", pattern="^(png|raw)$")
+):
+    """Density raster of a section over the last closed minutes, as PNG or raw float32 cells"""
+    if resolution not in heatmap_raster.RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {heatmap_raster.RESOLUTIONS}")
+    body, headers = await heatmap_raster.render(section, minutes, resolution, sigma, fmt)
+    media_type = "image/png" if fmt == "png" else "application/octet-stream"
+    return Response(content=body, media_type=media_type, headers=dict(headers, **{"Cache-Control": "max-age=30"}))
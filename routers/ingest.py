@@ -0,0 +1,76 @@
+import json
+import os
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import ValidationError
+from ingest import TABLE_MODELS, BufferFullError, write_batch, write_buffer
+
+router = APIRouter(prefix="/api/ingest", tags=["ingest"])
+
+MAX_BATCH_SIZE = int(os.getenv("INGEST_MAX_BATCH", 50000))
+
+async def _parse_records(request: Request, table: str):
+    """Parse a JSON array or NDJSON body into validated *Create models"""
+    body = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+            if isinstance(items, dict):
+                items = [items]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} records")
+
+    model = TABLE_MODELS[table]
+    records = []
+    for index, item in enumerate(items):
+        try:
+            records.append(model.model_validate(item))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail={"index": index, "errors": e.errors(include_url=False)})
+    return records
+
+async def _ingest_batch(request: Request, table: str):
+    records = await _parse_records(request, table)
+    inserted = await write_batch(table, records)
+    return {"table": table, "inserted": inserted}
+
+@router.post("/visitors")
+async def ingest_visitors(request: Request):
+    """Bulk insert visitor records (JSON array or NDJSON)"""
+    return await _ingest_batch(request, "visitors")
+
+@router.post("/cashier")
+async def ingest_cashier(request: Request):
+    """Bulk insert cashier records (JSON array or NDJSON)"""
+    return await _ingest_batch(request, "cashier")
+
+@router.post("/heatmap")
+async def ingest_heatmap(request: Request):
+    """Bulk insert heatmap records (JSON array or NDJSON)"""
+    return await _ingest_batch(request, "heatmap")
+
+@router.post("/predictions")
+async def ingest_predictions(request: Request):
+    """Bulk insert prediction records (JSON array or NDJSON)"""
+    return await _ingest_batch(request, "predictions")
+
+@router.post("/{table}/events", status_code=202)
+async def ingest_events(table: str, request: Request):
+    """Queue single events for the next buffered flush"""
+    if table not in TABLE_MODELS:
+        raise HTTPException(status_code=404, detail=f"Unknown table '{table}'")
+    records = await _parse_records(request, table)
+    try:
+        # All or nothing, so a client retrying after a 503 never writes events twice
+        await write_buffer.put_many(table, records)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BufferFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return {"table": table, "queued": len(records)}
+
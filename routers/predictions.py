@@ -1,37 +1,60 @@
 from fastapi import APIRouter, Query
-from typing import Optional, List
+from typing import Optional
+from serialization import FastJSONResponse
 from models import Prediction
-from crud import PredictionCRUD
+from async_crud import PredictionCRUD
+import forecasting
 
 router = APIRouter(prefix="/api/predictions", tags=["predictions"])
 
-@router.get("/", response_model=List[dict])
+@router.get("/")
 async def get_all_predictions():
     """Get all prediction forecasts"""
-    return PredictionCRUD.get_latest_forecasts()
+    return FastJSONResponse(await PredictionCRUD.get_latest_forecasts())
 
-@router.get("/metric/{metric_type}", response_model=dict)
+@router.get("/metric/{metric_type}")
 async def get_metric_prediction(
     metric_type: str,
     horizon: str = Query("1h", pattern="^(1h|4h|8h|1d|7d)$")
 ):
     """Get prediction for specific metric"""
-    prediction = PredictionCRUD.get_metric_forecast(metric_type, horizon)
+    prediction = await PredictionCRUD.get_metric_forecast(metric_type, horizon)
     if not prediction:
         return {"message": f"No prediction available for {metric_type} ({horizon})"}
-    return prediction
+    return FastJSONResponse(prediction)
 
-@router.get("/traffic/forecast", response_model=dict)
+@router.get("/sections")
+async def get_section_forecasts(
+    horizon: Optional[str] = Query(None, pattern="^(1h|4h|8h|1d|7d)$")
+):
+    """Per-section visitor forecasts with intervals from the latest model run"""
+    sections = {
+        name.split(":", 1)[1]: forecast
+        for name, forecast in forecasting.latest['series'].items()
+        if name.startswith("visitors:")
+    }
+    if horizon:
+        sections = {
+            section: {'model': forecast['model'], 'horizons': {horizon: forecast['horizons'][horizon]}}
+            for section, forecast in sections.items()
+        }
+    return FastJSONResponse({
+        "fitted_at": forecasting.latest['fitted_at'],
+        "history_hours": forecasting.latest['history_hours'],
+        "sections": sections
+    })
+
+@router.get("/traffic/forecast")
 async def get_traffic_forecast():
     """Get comprehensive traffic forecast"""
-    visitors_pred = PredictionCRUD.get_metric_forecast("visitors", "4h")
-    queue_pred = PredictionCRUD.get_metric_forecast("cashier_queue", "4h")
+    visitors_pred = await PredictionCRUD.get_metric_forecast("visitors", "4h")
+    queue_pred = await PredictionCRUD.get_metric_forecast("cashier_queue", "4h")
     
-    return {
+    return FastJSONResponse({
         "visitors_forecast": visitors_pred,
         "queue_forecast": queue_pred,
         "recommendation": generate_recommendation(visitors_pred, queue_pred)
-    }
+    })
 
 def generate_recommendation(visitors_pred, queue_pred):
     """Generate business recommendation based on predictions"""
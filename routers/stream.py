@@ -0,0 +1,79 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pubsub import TOPICS, broker
+from serialization import dumps_text
+
+router = APIRouter(prefix="/api/stream", tags=["stream"])
+
+KEEPALIVE_SECONDS = 15
+
+def _parse_topics(topics: str):
+    parsed = [topic.strip() for topic in topics.split(",") if topic.strip()]
+    unknown = [topic for topic in parsed if topic.split(":", 1)[0] not in TOPICS]
+    if unknown or not parsed:
+        raise ValueError(f"Unknown topics {unknown}; expected {', '.join(TOPICS)} or <topic>:<section>")
+    return parsed
+
+@router.get("/sse")
+async def stream_events(request: Request, topics: str = Query(",".join(TOPICS[:3]))):
+    """Server-Sent Events feed of updates for comma-separated topics"""
+    try:
+        subscription = broker.subscribe(_parse_topics(topics))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await subscription.get(timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {message['topic']}\ndata: {dumps_text(message['data'])}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def stream_websocket(websocket: WebSocket, topics: str = ",".join(TOPICS[:3])):
+    """WebSocket feed; send {"subscribe": [...]} or {"unsubscribe": [...]} to change topics"""
+    try:
+        parsed = _parse_topics(topics)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    await websocket.accept()
+    subscription = broker.subscribe(parsed)
+
+    async def receive():
+        while True:
+            request = await websocket.receive_json()
+            if request.get("subscribe"):
+                try:
+                    subscription.topics.update(_parse_topics(",".join(request["subscribe"])))
+                except ValueError as e:
+                    await websocket.send_json({"error": str(e)})
+            subscription.topics.difference_update(request.get("unsubscribe", []))
+
+    async def send():
+        while True:
+            message = await subscription.get()
+            await websocket.send_text(dumps_text(message))
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        broker.unsubscribe(subscription)
+        for task in tasks:
+            if task.done() and not task.cancelled() and not isinstance(task.exception(), WebSocketDisconnect):
+                print(f"WebSocket stream closed: {task.exception()}")
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Query, HTTPException, Path
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from serialization import FastJSONResponse
+import timeseries
+
+router = APIRouter(prefix="/api/timeseries", tags=["timeseries"])
+
+@router.get("/")
+async def list_metrics():
+    """Metrics available as time series"""
+    return {"metrics": {metric: source for metric, (source, _) in timeseries.METRICS.items()}}
+
+@router.get("/{metric}")
+async def get_timeseries(
+    metric: str = Path(..., pattern=f"^({'|'.join(timeseries.METRICS)})$"),
+    start: Optional[datetime] = Query(None, description="Defaults to end - hours"),
+    end: Optional[datetime] = Query(None, description="Defaults to now"),
+    hours: int = Query(24, ge=1, le=24 * 366),
+    bucket: Optional[int] = Query(None, ge=1, le=86400, description="Seconds per bucket; default fits max_points"),
+    max_points: int = Query(600, ge=3, le=5000),
+    section: Optional[str] = None
+):
+    """Bucketed, LTTB-downsampled series as parallel timestamp and value arrays"""
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=hours)
+    try:
+        return FastJSONResponse(await timeseries.series(metric, start, end, bucket, max_points, section))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
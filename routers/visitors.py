@@ -1,47 +1,88 @@
 from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timedelta
 from typing import Optional, List
 from models import Visitor, TimeRange, AnalyticsResponse
-from crud import VisitorCRUD, AnalyticsCRUD
+from async_crud import VisitorCRUD, AnalyticsCRUD
+from pagination import decode_cursor, next_cursor
+from retention import choose_tier
+from serialization import FastJSONResponse, dumps
 
 router = APIRouter(prefix="/api/visitors", tags=["visitors"])
 
-@router.get("/", response_model=List[dict])
+@router.get("/")
 async def get_all_visitors(
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page")
 ):
-    """Get all visitor records"""
-    return VisitorCRUD.get_all(limit=limit)
+    """Get visitor records, newest first, one keyset page at a time"""
+    try:
+        after = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = await VisitorCRUD.get_all(limit=limit, after=after)
+    token = next_cursor(rows, limit)
+    return FastJSONResponse(rows, headers={"X-Next-Cursor": token} if token else None)
 
-@router.get("/current", response_model=dict)
+@router.get("/current")
 async def get_current_visitors():
     """Get current visitor count"""
-    count = VisitorCRUD.get_current_count()
+    count = await VisitorCRUD.get_current_count()
     return {"current_visitors": count, "timestamp": datetime.now()}
 
-@router.get("/sections", response_model=List[dict])
+@router.get("/sections")
 async def get_section_traffic():
     """Get visitor distribution by section"""
-    return VisitorCRUD.get_section_traffic()
+    return FastJSONResponse(await VisitorCRUD.get_section_traffic())
 
-@router.get("/{visitor_id}", response_model=dict)
+@router.get("/{visitor_id}")
 async def get_visitor(visitor_id: int):
     """Get specific visitor record by ID"""
-    visitor = VisitorCRUD.get_by_id(visitor_id)
+    visitor = await VisitorCRUD.get_by_id(visitor_id)
     if not visitor:
         raise HTTPException(status_code=404, detail="Visitor record not found")
-    return visitor
+    return FastJSONResponse(visitor)
 
-@router.post("/range", response_model=List[dict])
-async def get_visitors_by_range(time_range: TimeRange):
-    """Get visitors within a time range"""
-    return VisitorCRUD.get_by_date_range(
-        time_range.start_time, 
-        time_range.end_time
-    )
+async def _single_batch(rows: List[dict]):
+    yield rows
+
+async def _stream_range(batches, fmt: str):
+    if fmt == "ndjson":
+        async for rows in batches:
+            yield b"".join(dumps(row) + b"\n" for row in rows)
+        return
+    separator = b"["
+    async for rows in batches:
+        yield separator + b",".join(dumps(row) for row in rows)
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+@router.post("/range")
+async def get_visitors_by_range(
+    time_range: TimeRange,
+    stream: bool = Query(False, description="Stream rows from a server-side cursor"),
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|json)$"),
+    batch_size: int = Query(2000, ge=100, le=50000),
+    resolution: Optional[int] = Query(None, ge=0, description="Coarsest acceptable seconds per point")
+):
+    """Get visitors within a time range, from raw rows or the coarsest rollup tier that fits"""
+    start, end = time_range.start_time, time_range.end_time
+    tier = choose_tier("visitors", start, end, resolution or 0)
+    if stream:
+        media_type = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+        if tier == "raw":
+            batches = VisitorCRUD.stream_by_date_range(start, end, batch_size)
+        else:
+            batches = _single_batch(await VisitorCRUD.get_bucketed_range(start, end, tier))
+        return StreamingResponse(_stream_range(batches, fmt), media_type=media_type,
+                                 headers={"X-Data-Tier": tier})
+    if tier != "raw":
+        rows = await VisitorCRUD.get_bucketed_range(start, end, tier)
+    else:
+        rows = await VisitorCRUD.get_by_date_range(start, end)
+    return FastJSONResponse(rows, headers={"X-Data-Tier": tier})
 
 @router.get("/analytics/daily", response_model=AnalyticsResponse)
 async def get_daily_analytics():
     """Get daily analytics summary"""
-    return AnalyticsCRUD.get_daily_summary()
\ No newline at end of file
+    return await AnalyticsCRUD.get_daily_summary()
\ No newline at end of file
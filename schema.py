@@ -0,0 +1,433 @@
+"""Schema manager: tables, indexes, monthly partitions and retention.
+
+visitors, cashier and heatmap are range-partitioned by month on timestamp,
+with partitions named <table>_pYYYYMM. A DEFAULT partition catches rows
+outside every monthly range. Partitions are created PARTITIONS_AHEAD months
+in advance. Raw retention (the raw= entry of RETENTION_<TABLE>, see
+retention.py) drops whole partitions instead of deleting rows. Raw rows the
+rollups have not folded in yet are never dropped.
+
+Fresh databases get partitioned tables directly. Existing unpartitioned
+tables keep working and are converted with `python schema.py partition
+<table>`. That is an offline step: it rewrites the table under an
+exclusive lock. Rows with a NULL timestamp cannot satisfy the (id, timestamp)
+key; the conversion dates them at the epoch, in the DEFAULT partition, where
+raw retention deletes them once it is enabled.
+
+    python schema.py ensure      # tables, partitions, indexes, rollups, heatmap_latest
+    python schema.py verify      # report missing or invalid pieces; exit 1 if any
+    python schema.py maintain    # create future partitions, apply tiered retention
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from async_database import adb
+from background import PeriodicTask
+import heatmap_latest
+import retention
+import rollups
+
+PARTITIONED = ('visitors', 'cashier', 'heatmap')
+PARTITIONS_AHEAD = int(os.getenv('SCHEMA_PARTITIONS_AHEAD', 3))
+MAINTENANCE_INTERVAL = float(os.getenv('SCHEMA_MAINTENANCE_INTERVAL', 3600))
+# pg_advisory_lock key serializing ensure() and maintain() across workers
+SCHEMA_LOCK_KEY = 7_305_114
+SCHEMA_LOCK_POLL = 0.5
+
+TABLES = {
+    'visitors': """
+        CREATE TABLE IF NOT EXISTS visitors (
+            id SERIAL,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            -- Inserting transaction; the rollup watermark (see rollups.py)
+            ingest_xid xid8 DEFAULT pg_current_xact_id(),
+            section TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            gender_distribution JSONB,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """,
+    'cashier': """
+        CREATE TABLE IF NOT EXISTS cashier (
+            id SERIAL,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            -- Inserting transaction; the rollup watermark (see rollups.py)
+            ingest_xid xid8 DEFAULT pg_current_xact_id(),
+            queue_length INTEGER NOT NULL,
+            wait_time_minutes DOUBLE PRECISION,
+            transactions_count INTEGER,
+            status TEXT NOT NULL,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """,
+    'heatmap': """
+        CREATE TABLE IF NOT EXISTS heatmap (
+            id SERIAL,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            -- Inserting transaction; the raster binner's watermark (see heatmap_raster.py)
+            ingest_xid xid8 DEFAULT pg_current_xact_id(),
+            section TEXT NOT NULL,
+            density_level TEXT NOT NULL,
+            coordinates JSONB,
+            visitor_count INTEGER NOT NULL,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """,
+    'predictions': """
+        CREATE TABLE IF NOT EXISTS predictions (
+            id SERIAL PRIMARY KEY,
+            prediction_timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            metric_type TEXT NOT NULL,
+            predicted_value DOUBLE PRECISION NOT NULL,
+            confidence_level DOUBLE PRECISION NOT NULL,
+            forecast_horizon TEXT NOT NULL
+        )
+    """,
+}
+
+# Index name -> column list, per table
+INDEXES = {
+    'visitors': {
+        # Time-range reads and (timestamp, id) keyset pages
+        'visitors_timestamp_id_idx': '(timestamp, id)',
+        'visitors_section_timestamp_idx': '(section, timestamp DESC)',
+        # Rollup folds and the not-yet-rolled-up rows readers add to the rollups
+        'visitors_ingest_xid_idx': '(ingest_xid)',
+    },
+    'cashier': {
+        'cashier_timestamp_id_idx': '(timestamp, id)',
+        'cashier_ingest_xid_idx': '(ingest_xid)',
+    },
+    'heatmap': {
+        'heatmap_timestamp_id_idx': '(timestamp, id)',
+        'heatmap_section_timestamp_idx': '(section, timestamp DESC)',
+        'heatmap_ingest_xid_idx': '(ingest_xid)',
+    },
+    'predictions': {
+        'predictions_metric_horizon_ts_idx': '(metric_type, forecast_horizon, prediction_timestamp DESC)',
+    },
+}
+
+PARTITION_NAME = re.compile(r'^(?P<table>\w+)_p(?P<month>\d{6})$')
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+async def _relkind(cur, table: str):
+    """'p' for partitioned, 'r' for a plain table, None if missing"""
+    await cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = await cur.fetchone()
+    return row['relkind'] if row else None
+
+@asynccontextmanager
+async def _schema_lock():
+    """Hold the schema advisory lock, so workers starting together run DDL one at a time"""
+    # A session lock on its own autocommit connection, since the steps use several connections.
+    # Polled with try: a backend blocked in pg_advisory_lock holds a snapshot, and the holder's
+    # CREATE INDEX CONCURRENTLY would wait for that snapshot forever
+    async with adb.get_connection() as conn:
+        await conn.set_autocommit(True)
+        try:
+            while True:
+                cur = await conn.execute("SELECT pg_try_advisory_lock(%s) AS locked", (SCHEMA_LOCK_KEY,))
+                if (await cur.fetchone())['locked']:
+                    break
+                await asyncio.sleep(SCHEMA_LOCK_POLL)
+            try:
+                yield
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(%s)", (SCHEMA_LOCK_KEY,))
+        finally:
+            await conn.set_autocommit(False)
+
+async def create_tables():
+    async with adb.get_cursor() as cur:
+        for statement in TABLES.values():
+            await cur.execute(statement)
+    # heatmap predates ingest_xid on existing deployments; visitors and cashier get theirs in rollups
+    await rollups.add_xid_column('heatmap')
+
+async def _create_partition(cur, table: str, month: datetime) -> bool:
+    """Create one monthly partition, moving matching rows out of the default partition"""
+    name = partition_name(table, month)
+    if await _relkind(cur, name):
+        return False
+    start, end = month.isoformat(), _add_months(month, 1).isoformat()
+    await cur.execute(f"""
+        SELECT EXISTS (SELECT 1 FROM {table}_default WHERE timestamp >= %s AND timestamp < %s) AS stray
+    """, (start, end))
+    if (await cur.fetchone())['stray']:
+        # Attaching would fail while the default partition holds rows of this range
+        await cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        await cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM {table}_default WHERE timestamp >= %s AND timestamp < %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """, (start, end))
+        await cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+    else:
+        await cur.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}')")
+    return True
+
+async def ensure_partitions(months_ahead: int = PARTITIONS_AHEAD) -> List[str]:
+    """Create the default partition and monthly partitions through months_ahead; returns new ones"""
+    created = []
+    current = _month_start(datetime.now(timezone.utc))
+    for table in PARTITIONED:
+        async with adb.get_cursor() as cur:
+            if await _relkind(cur, table) != 'p':
+                continue
+            await cur.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+            for offset in range(months_ahead + 1):
+                month = _add_months(current, offset)
+                if await _create_partition(cur, table, month):
+                    created.append(partition_name(table, month))
+    return created
+
+async def _index_state(cur, name: str):
+    """'valid', 'invalid' (a failed concurrent build) or None"""
+    await cur.execute("""
+        SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(%s)
+    """, (name,))
+    row = await cur.fetchone()
+    if row is None:
+        return None
+    return 'valid' if row['indisvalid'] else 'invalid'
+
+async def ensure_indexes() -> List[str]:
+    """Create missing indexes; plain tables are indexed CONCURRENTLY so writes keep flowing"""
+    created = []
+    async with adb.get_connection() as conn:
+        await conn.set_autocommit(True)
+        try:
+            async with conn.cursor() as cur:
+                for table, indexes in INDEXES.items():
+                    kind = await _relkind(cur, table)
+                    if kind is None:
+                        continue
+                    for name, columns in indexes.items():
+                        state = await _index_state(cur, name)
+                        if state == 'valid':
+                            continue
+                        if state == 'invalid':
+                            await cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                        # Partitioned parents cannot be indexed concurrently; new partitions inherit the index
+                        concurrently = "" if kind == 'p' else "CONCURRENTLY"
+                        await cur.execute(f"CREATE INDEX {concurrently} IF NOT EXISTS {name} ON {table} {columns}")
+                        created.append(name)
+        finally:
+            await conn.set_autocommit(False)
+    return created
+
+async def partition_table(table: str) -> Dict[str, Any]:
+    """Convert an existing plain table into a monthly-partitioned one, keeping ids and sequence"""
+    if table not in PARTITIONED:
+        raise ValueError(f"{table} is not a partitioned table; expected one of {PARTITIONED}")
+    old = f"{table}_unpartitioned"
+    async with adb.get_cursor() as cur:
+        kind = await _relkind(cur, table)
+        if kind != 'r':
+            return {'table': table, 'converted': False, 'reason': 'already partitioned' if kind == 'p' else 'missing'}
+        await cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        await cur.execute("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'", (table,))
+        primary_key = await cur.fetchone()
+        await cur.execute("SELECT pg_get_serial_sequence(%s, 'id') AS sequence", (table,))
+        sequence = (await cur.fetchone())['sequence']
+        await cur.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        if primary_key:
+            # Free the name the new table's (id, timestamp) key may take
+            await cur.execute(f'ALTER TABLE {old} RENAME CONSTRAINT "{primary_key["conname"]}" TO {old}_pkey')
+        # The sequence would be dropped with the old table; hand it to the new one
+        await cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+        await cur.execute(f"""
+            CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, PRIMARY KEY (id, timestamp))
+            PARTITION BY RANGE (timestamp)
+        """)
+        await cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+        await cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        await cur.execute(f"SELECT MIN(timestamp) AS first FROM {old}")
+        first = (await cur.fetchone())['first'] or datetime.now(timezone.utc)
+        month, last = _month_start(first), _add_months(_month_start(datetime.now(timezone.utc)), PARTITIONS_AHEAD)
+        partitions = 0
+        while month <= last:
+            await _create_partition(cur, table, month)
+            month, partitions = _add_months(month, 1), partitions + 1
+        # The key needs a timestamp; undated rows land in the default partition at the epoch
+        # (not -infinity, which drivers cannot load), below every monthly range
+        await cur.execute(f"UPDATE {old} SET timestamp = 'epoch' WHERE timestamp IS NULL")
+        undated = cur.rowcount
+        await cur.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+        rows = cur.rowcount
+        await cur.execute(f"DROP TABLE {old}")
+    # Triggers and indexes lived on the old table
+    await ensure()
+    return {'table': table, 'converted': True, 'rows': rows, 'undated': undated, 'partitions': partitions}
+
+async def _partitions(cur, table: str) -> List[Dict[str, Any]]:
+    """Monthly partitions of table, oldest first, with their [start, end) ranges"""
+    await cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (table,))
+    partitions = []
+    for row in await cur.fetchall():
+        match = PARTITION_NAME.match(row['relname'])
+        if match and match['table'] == table:
+            start = datetime.strptime(match['month'], '%Y%m').replace(tzinfo=timezone.utc)
+            partitions.append({'name': row['relname'], 'start': start, 'end': _add_months(start, 1)})
+    return sorted(partitions, key=lambda partition: partition['start'])
+
+async def apply_retention() -> List[str]:
+    """Drop raw partitions that ended before each table's raw retention cutoff"""
+    dropped = []
+    for table in PARTITIONED:
+        cutoff = retention.cutoff(table, 'raw')
+        if cutoff is None:
+            continue
+        async with adb.get_cursor() as cur:
+            kind = await _relkind(cur, table)
+        if kind == 'r':
+            deleted = await retention.delete_raw(table, cutoff)
+            if deleted:
+                dropped.append(f"{table}: {deleted} rows")
+            continue
+        if kind != 'p':
+            continue
+        rolled_up = table in rollups.FOLD_SQL
+        async with adb.get_cursor() as cur:
+            partitions = await _partitions(cur, table)
+        # One short transaction per partition, so a DROP's lock on the parent is not held
+        # while the next partition is scanned
+        for partition in partitions:
+            if partition['end'] > cutoff:
+                break
+            pending = False
+            async with adb.get_cursor() as cur:
+                if rolled_up:
+                    await cur.execute(f"""
+                        SELECT EXISTS (SELECT 1 FROM {partition['name']} WHERE {rollups.pending(table)}) AS pending
+                    """)
+                    pending = (await cur.fetchone())['pending']
+                if not pending:
+                    await cur.execute(f"DROP TABLE {partition['name']}")
+            if pending:
+                print(f"Retention kept {partition['name']}: rows not rolled up yet")
+                break
+            dropped.append(partition['name'])
+        # Stray old rows in the default partition, deleted in batches like unpartitioned tables
+        guard = f"AND {rollups.folded(table)}" if rolled_up else ""
+        deleted = await retention._delete_batches(f"""
+            DELETE FROM {table}_default WHERE ctid = ANY(ARRAY(
+                SELECT ctid FROM {table}_default WHERE timestamp < %s {guard} LIMIT %s
+            ))
+        """, (cutoff,))
+        if deleted:
+            dropped.append(f"{table}_default: {deleted} rows")
+    return dropped
+
+async def verify() -> Dict[str, Any]:
+    """Report table kinds, index validity, partition coverage and derived tables"""
+    report = {'ok': True, 'tables': {}}
+    horizon = _add_months(_month_start(datetime.now(timezone.utc)), PARTITIONS_AHEAD)
+    async with adb.get_cursor() as cur:
+        for table in TABLES:
+            kind = await _relkind(cur, table)
+            entry = {'kind': {'p': 'partitioned', 'r': 'table', None: 'missing'}.get(kind, kind)}
+            entry['indexes'] = {name: await _index_state(cur, name) or 'missing' for name in INDEXES[table]}
+            problems = [f"index {name} {state}" for name, state in entry['indexes'].items() if state != 'valid']
+            if kind is None:
+                problems.append("table missing")
+            if table in PARTITIONED:
+                if kind == 'p':
+                    partitions = await _partitions(cur, table)
+                    entry['partitions'] = len(partitions)
+                    entry['covered_until'] = partitions[-1]['end'].isoformat() if partitions else None
+                    entry['default_partition'] = await _relkind(cur, f"{table}_default") is not None
+                    if not partitions or partitions[-1]['start'] < horizon:
+                        problems.append(f"fewer than {PARTITIONS_AHEAD} future partitions")
+                elif kind == 'r':
+                    problems.append(f"not partitioned (run: python schema.py partition {table})")
+            entry['problems'] = problems
+            report['tables'][table] = entry
+            report['ok'] = report['ok'] and not [p for p in problems if not p.startswith("not partitioned")]
+        derived = ['rollup_state'] + [f"{prefix}_rollup_{g}" for prefix in ('visitor', 'cashier') for g in rollups.GRANULARITIES]
+        derived.append('heatmap_latest')
+        report['derived_tables'] = {name: await _relkind(cur, name) is not None for name in derived}
+        await cur.execute("SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'heatmap_latest_sync') AS present")
+        report['heatmap_latest_trigger'] = (await cur.fetchone())['present']
+    report['retention'] = retention.POLICY
+    report['ok'] = report['ok'] and all(report['derived_tables'].values()) and report['heatmap_latest_trigger']
+    return report
+
+async def ensure() -> Dict[str, str]:
+    """Bring the schema up to date; each step runs even if an earlier one failed"""
+    results = {}
+    steps = (
+        ('tables', create_tables),
+        ('rollups', rollups.ensure_tables),
+        ('heatmap_latest', heatmap_latest.ensure_tables),
+        ('partitions', ensure_partitions),
+        ('indexes', ensure_indexes),
+    )
+    async with _schema_lock():
+        for name, step in steps:
+            try:
+                await step()
+                results[name] = 'ok'
+            except Exception as e:
+                results[name] = f"failed: {e}"
+                print(f"⚠️  Warning: schema step '{name}' failed: {e}")
+    return results
+
+async def maintain() -> Dict[str, Any]:
+    """Periodic upkeep: future partitions, raw retention, then rollup tier retention"""
+    async with _schema_lock():
+        return {
+            'created': await ensure_partitions(),
+            'dropped': await apply_retention(),
+            'trimmed': await retention.trim_rollups(),
+        }
+
+maintenance_task = PeriodicTask("schema", maintain, MAINTENANCE_INTERVAL, initial_delay=60)
+
+async def _cli(args) -> int:
+    try:
+        if args.command == 'ensure':
+            result = await ensure()
+            failed = any(value != 'ok' for value in result.values())
+        elif args.command == 'verify':
+            result = await verify()
+            failed = not result['ok']
+        elif args.command == 'partition':
+            result = [await partition_table(table) for table in args.tables or PARTITIONED]
+            failed = False
+        else:
+            result = await maintain()
+            failed = False
+        print(json.dumps(result, indent=2, default=str))
+        return 1 if failed else 0
+    finally:
+        await adb.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage tables, indexes and partitions")
+    parser.add_argument('command', choices=('ensure', 'verify', 'partition', 'maintain'))
+    parser.add_argument('tables', nargs='*', help="tables to convert (partition only)")
+    raise SystemExit(asyncio.run(_cli(parser.parse_args())))
+
+if __name__ == '__main__':
+    main()
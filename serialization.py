@@ -0,0 +1,37 @@
+"""Fast JSON encoding for API responses.
+
+FastAPI normally passes every returned row through jsonable_encoder (and
+through response_model validation when one is set) before the stdlib
+encoder sees it. Routes that return database rows return a
+FastJSONResponse directly instead: orjson encodes the rows in one pass.
+datetimes, dates and numpy values are handled natively. Decimals (SUM and
+AVG columns) go through _default and stay strings such as "1.50", as the
+response_model serialization sent them; UTC datetimes keep the "Z" suffix
+clients already parse. The SSE, WebSocket and NOTIFY payloads use dumps too,
+so a field has the same JSON type on every channel.
+"""
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    # Decimals, and anything else stream payloads carry (tool inputs), as their string form
+    return str(value)
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+def dumps_text(content: Any) -> str:
+    """dumps as str, for SSE lines, WebSocket text frames and NOTIFY payloads"""
+    return dumps(content).decode()
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; return it from a route to skip jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
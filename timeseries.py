@@ -0,0 +1,120 @@
+"""Time-bucketed metric series for charts.
+
+A series is aggregated in SQL into fixed buckets of bucket_seconds, read from
+the coarsest retention tier whose buckets fit (see retention.choose_tier).
+Rollup tiers are combined with the raw rows above the rollup watermark, so
+series stay exact. When the buckets outnumber max_points, the series is
+downsampled with LTTB, which keeps the peaks. Only complete buckets are
+returned: end is rounded down to a bucket boundary. The result is columnar:
+parallel timestamp and value arrays. Its size depends on max_points, not
+on the window.
+"""
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+import numpy as np
+from async_database import adb
+from downsample import lttb
+from retention import ROLLUP_PREFIX, TIERS, choose_tier
+from rollups import pending
+
+# Column name -> (rollup expression, raw expression), per source table
+SOURCES = {
+    'visitors': {
+        'ts': ('bucket', 'timestamp'),
+        'section': ('section', 'section'),
+        'total': ('total_visitors', 'count'),
+        'records': ('records_count', '1'),
+    },
+    'cashier': {
+        'ts': ('bucket', 'timestamp'),
+        'queue_sum': ('queue_sum', 'queue_length'),
+        'queue_max': ('queue_max', 'queue_length'),
+        'wait_sum': ('wait_sum', 'COALESCE(wait_time_minutes, 0)'),
+        'wait_count': ('wait_count', '(wait_time_minutes IS NOT NULL)::int'),
+        'records': ('records_count', '1'),
+    },
+}
+
+# Metric -> (source table, aggregate over the source columns)
+METRICS = {
+    'visitors': ('visitors', "SUM(total)"),
+    'visitor_records': ('visitors', "SUM(records)"),
+    'cashier_queue': ('cashier', "SUM(queue_sum)::float8 / SUM(records)"),
+    'cashier_queue_max': ('cashier', "MAX(queue_max)"),
+    'cashier_wait': ('cashier', "SUM(wait_sum) / NULLIF(SUM(wait_count), 0)"),
+}
+
+# Default buckets aim for this many source points per returned point, so LTTB has peaks to pick from
+OVERSAMPLE = 4
+
+def _parts_sql(source: str, tier: str, section: Optional[str]) -> str:
+    columns = SOURCES[source]
+    section_filter = "AND section = %(section)s" if section else ""
+    raw = f"""
+        SELECT {', '.join(f'{raw} AS {name}' for name, (_, raw) in columns.items())}
+        FROM {source}
+        WHERE timestamp >= %(start)s AND timestamp < %(end)s {section_filter}
+    """
+    if tier == 'raw':
+        return raw
+    return f"""
+        SELECT {', '.join(f'{rollup} AS {name}' for name, (rollup, _) in columns.items())}
+        FROM {ROLLUP_PREFIX[source]}_rollup_{tier}
+        WHERE bucket >= %(start)s AND bucket < %(end)s {section_filter}
+        UNION ALL
+        {raw} AND {pending(source)}
+    """
+
+def default_bucket(start: datetime, end: datetime, max_points: int) -> int:
+    """Whole minutes giving about OVERSAMPLE * max_points buckets over the window"""
+    seconds = (end - start).total_seconds() / (max_points * OVERSAMPLE)
+    return max(60, math.ceil(seconds / 60) * 60)
+
+async def series(metric: str, start: datetime, end: datetime, bucket_seconds: Optional[int] = None,
+                 max_points: int = 600, section: Optional[str] = None) -> Dict[str, Any]:
+    """Columnar series of metric over whole buckets in [start, end); timestamps are Unix seconds at bucket start"""
+    source, value = METRICS[metric]
+    if section and 'section' not in SOURCES[source]:
+        raise ValueError(f"{metric} has no sections")
+    start, end = (moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment for moment in (start, end))
+    if start >= end:
+        raise ValueError("start must be before end")
+    bucket_seconds = bucket_seconds or default_bucket(start, end, max_points)
+    tier = choose_tier(source, start, end, bucket_seconds)
+    if TIERS[tier]:
+        # Buckets are whole multiples of the tier's own buckets
+        bucket_seconds = math.ceil(bucket_seconds / TIERS[tier]) * TIERS[tier]
+    # Both ends fall on bucket boundaries: the in-progress bucket at the end would read as a false drop
+    # (and LTTB always keeps the last point), and rollup buckets, which are whole multiples, never
+    # straddle an aligned end
+    aligned = datetime.fromtimestamp(start.timestamp() // bucket_seconds * bucket_seconds, tz=timezone.utc)
+    end = datetime.fromtimestamp(end.timestamp() // bucket_seconds * bucket_seconds, tz=timezone.utc)
+    if aligned >= end:
+        raise ValueError(f"window holds no complete {bucket_seconds}s bucket")
+    async with adb.get_cursor() as cur:
+        await cur.execute(f"""
+            SELECT ts, value FROM (
+                SELECT (floor(extract(epoch FROM ts) / %(bucket)s) * %(bucket)s)::bigint AS ts,
+                       ({value})::float8 AS value
+                FROM ({_parts_sql(source, tier, section)}) parts
+                GROUP BY 1
+            ) buckets
+            WHERE value IS NOT NULL
+            ORDER BY ts
+        """, {'start': aligned, 'end': end, 'bucket': bucket_seconds, 'section': section})
+        rows = await cur.fetchall()
+    timestamps = np.fromiter((row['ts'] for row in rows), dtype=np.int64, count=len(rows))
+    values = np.fromiter((row['value'] for row in rows), dtype=np.float64, count=len(rows))
+    keep = lttb(timestamps, values, max_points)
+    return {
+        'metric': metric,
+        'section': section,
+        'tier': tier,
+        'bucket_seconds': bucket_seconds,
+        'start': aligned,
+        'end': end,
+        'source_points': len(rows),
+        'timestamps': timestamps[keep].tolist(),
+        'values': values[keep].tolist(),
+    }
@@ -0,0 +1,153 @@
+"""Online cashier wait-time estimator.
+
+Each cashier record with a queue and a measured wait gives one observation
+of minutes per queued customer (the inverse of the service rate). These are
+kept as exponentially weighted mean and variance per hour of day in store
+time, plus an all-hours fallback. Each record updates them in O(1). A
+background task folds in rows by inserting transaction, up to the oldest
+transaction still running, as the rollups do. Rows that commit late are
+therefore still learned, and every worker learns from every row. Estimates
+are computed from memory, without a query.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+from statistics import NormalDist
+from typing import Any, Dict, Optional
+from zoneinfo import ZoneInfo
+from async_database import adb
+from async_crud import CashierCRUD
+from background import PeriodicTask
+
+ALPHA = float(os.getenv('WAIT_TIME_ALPHA', 0.05))
+MIN_SAMPLES = int(os.getenv('WAIT_TIME_MIN_SAMPLES', 10))
+BAND_LEVEL = float(os.getenv('WAIT_TIME_BAND', 0.8))
+DEFAULT_MINUTES_PER_CUSTOMER = float(os.getenv('WAIT_TIME_DEFAULT_PER_CUSTOMER', 2))
+STORE_TZ = ZoneInfo(os.getenv('STORE_TIMEZONE', 'UTC'))
+HISTORY_DAYS = int(os.getenv('WAIT_TIME_HISTORY_DAYS', 28))
+REFRESH_INTERVAL = float(os.getenv('WAIT_TIME_REFRESH', 5))
+BATCH_ROWS = 10000
+
+class EWStats:
+    """Exponentially weighted mean and variance, updated in constant time"""
+    __slots__ = ('mean', 'var', 'count')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, value: float, alpha: float):
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.var = (1 - alpha) * (self.var + diff * increment)
+        self.count += 1
+
+class WaitTimeEstimator:
+    def __init__(self, alpha: float = ALPHA, min_samples: int = MIN_SAMPLES, band_level: float = BAND_LEVEL,
+                 default_per_customer: float = DEFAULT_MINUTES_PER_CUSTOMER, tz=STORE_TZ):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.z = NormalDist().inv_cdf(0.5 + band_level / 2)
+        self.band_level = band_level
+        self.default_per_customer = default_per_customer
+        self.tz = tz
+        self.by_hour = [EWStats() for _ in range(24)]
+        self.overall = EWStats()
+        self.skipped = 0
+
+    def update(self, timestamp: datetime, queue_length: Optional[int], wait_time_minutes: Optional[float]) -> bool:
+        """Learn from one cashier record; records without a queue or measured wait are skipped"""
+        if not queue_length or queue_length <= 0 or wait_time_minutes is None or wait_time_minutes < 0:
+            self.skipped += 1
+            return False
+        per_customer = wait_time_minutes / queue_length
+        self.by_hour[self._hour(timestamp)].update(per_customer, self.alpha)
+        self.overall.update(per_customer, self.alpha)
+        return True
+
+    def _hour(self, timestamp: Optional[datetime]) -> int:
+        timestamp = timestamp or datetime.now(timezone.utc)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.astimezone(self.tz).hour
+
+    def estimate(self, queue_length: int, at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Expected wait for queue_length customers at time at, with a confidence band"""
+        stats = self.by_hour[self._hour(at)]
+        basis = 'hour_of_day'
+        if stats.count < self.min_samples:
+            stats, basis = self.overall, 'all_hours'
+        if stats.count < self.min_samples:
+            # Too little data to learn from: default rate, band of +/-50%
+            mean, spread, basis = self.default_per_customer, self.default_per_customer / 2, 'default'
+        else:
+            mean, spread = stats.mean, self.z * stats.var ** 0.5
+        queue_length = max(queue_length or 0, 0)
+        return {
+            'estimated_wait_minutes': round(queue_length * mean, 1),
+            'lower_minutes': round(queue_length * max(mean - spread, 0), 1),
+            'upper_minutes': round(queue_length * (mean + spread), 1),
+            'confidence_level': self.band_level,
+            'minutes_per_customer': round(mean, 2),
+            'basis': basis,
+            'samples': stats.count,
+        }
+
+    def stats(self):
+        return {
+            'samples': self.overall.count,
+            'skipped': self.skipped,
+            'hours_learned': sum(stats.count >= self.min_samples for stats in self.by_hour),
+            'minutes_per_customer': round(self.overall.mean, 3) if self.overall.count else None,
+        }
+
+estimator = WaitTimeEstimator()
+# Every cashier row with a lower ingest_xid has been learned (see rollups.py)
+_state = {'last_xid': None}
+# Concurrent refreshes would read and learn the same rows twice
+_refresh_lock = asyncio.Lock()
+
+async def refresh():
+    """Fold cashier rows committed since the last refresh into the estimator"""
+    async with _refresh_lock, adb.get_cursor() as cur:
+        await cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot()) AS horizon")
+        horizon = (await cur.fetchone())['horizon']
+        if _state['last_xid'] is None:
+            # First run: learn from the history window only
+            where = "timestamp >= NOW() - make_interval(days => %s) AND (ingest_xid IS NULL OR ingest_xid < %s)"
+            params = (HISTORY_DAYS, horizon)
+        else:
+            where = "ingest_xid >= %s AND ingest_xid < %s"
+            params = (_state['last_xid'], horizon)
+        after = (datetime.min.replace(tzinfo=timezone.utc), 0)
+        while True:
+            await cur.execute(f"""
+                SELECT id, timestamp, queue_length, wait_time_minutes FROM cashier
+                WHERE {where} AND (timestamp, id) > (%s, %s)
+                ORDER BY timestamp, id LIMIT %s
+            """, params + after + (BATCH_ROWS,))
+            rows = await cur.fetchall()
+            for row in rows:
+                estimator.update(row['timestamp'], row['queue_length'], row['wait_time_minutes'])
+            if rows:
+                after = (rows[-1]['timestamp'], rows[-1]['id'])
+            if len(rows) < BATCH_ROWS:
+                break
+        _state['last_xid'] = horizon
+
+async def current_estimate() -> Optional[Dict[str, Any]]:
+    """Wait estimate for the latest cashier status, or None without cashier data"""
+    if not wait_time_task.stats()['running']:
+        # No background task in this process (e.g. the chatbot CLI): catch up on demand
+        await refresh()
+    status = await CashierCRUD.get_current_status()
+    if not status:
+        return None
+    return dict(estimator.estimate(status['queue_length']), queue_length=status['queue_length'])
+
+wait_time_task = PeriodicTask("wait_time", refresh, REFRESH_INTERVAL)